@@ -0,0 +1,144 @@
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Callable
+
+from app.core.config import config
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Files made by the app, such as reports, kept on disk within a byte budget.
+
+    Artifacts are named after their content. An artifact can be stored for a version of the data it was made
+    from, and `get` finds it again as long as that version is current, while `latest` finds the last one stored
+    for any version. Reuse goes by that version: files with timestamps inside, such as docx, differ every time.
+    Using an artifact marks it as recently used: `evict` removes the ones unused for `ttl` seconds, then the least
+    recently used ones until the store fits into `max_bytes`. Artifacts used in the last `grace` seconds are kept
+    either way, so that one can be sent after it was found. Processes sharing `root` share the store.
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl: float, grace: float) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.grace = grace
+
+    @property
+    def blobs_dir(self) -> Path:
+        return self.root / "blobs"
+
+    @property
+    def refs_dir(self) -> Path:
+        return self.root / "refs"
+
+    def _ref_path(self, kind: str, version: str) -> Path:
+        return self.refs_dir / f"{kind}-{hashlib.sha256(version.encode()).hexdigest()[:32]}"
+
+    def _latest_ref_path(self, kind: str) -> Path:
+        return self.refs_dir / f"{kind}-latest"
+
+    def _write_ref(self, ref_path: Path, name: str):
+        tmp_ref_path = self.root / f".{uuid.uuid4().hex}.ref"
+        tmp_ref_path.write_text(name)
+        os.replace(tmp_ref_path, ref_path)
+
+    def _read_ref(self, ref_path: Path) -> Path | None:
+        try:
+            name = ref_path.read_text()
+        except FileNotFoundError:
+            return None
+
+        return self.find(name)
+
+    def find(self, name: str) -> Path | None:
+        """The stored artifact with the given file name, `None` if it was evicted."""
+
+        blob = self.blobs_dir / name
+        try:
+            os.utime(blob)  # mtime is the time of the last use
+        except FileNotFoundError:
+            return None
+
+        return blob
+
+    def get(self, kind: str, version: str) -> Path | None:
+        """The artifact of `kind` stored for `version`, `None` if there is none or it was evicted."""
+
+        return self._read_ref(self._ref_path(kind, version))
+
+    def latest(self, kind: str) -> Path | None:
+        """The artifact of `kind` stored last for a version, whether that version is current or not."""
+
+        return self._read_ref(self._latest_ref_path(kind))
+
+    def put(self, kind: str, suffix: str, create: Callable[[Path], None], version: str | None = None) -> Path:
+        """Stores the file `create` writes to the path it is given and returns where it is stored."""
+
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.refs_dir.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = self.root / f".{uuid.uuid4().hex}{suffix}"
+        try:
+            create(tmp_path)
+
+            blob = self.blobs_dir / f"{kind}-{_file_digest(tmp_path)}{suffix}"
+            os.replace(tmp_path, blob)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        if version is not None:
+            self._write_ref(self._ref_path(kind, version), blob.name)
+            self._write_ref(self._latest_ref_path(kind), blob.name)
+
+        self.evict()
+
+        return blob
+
+    def evict(self):
+        """Removes expired artifacts, then the least recently used ones while the store is over its budget."""
+
+        blobs = []
+        for path in self.blobs_dir.glob("*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in blobs)
+        expired_before = time.time() - self.ttl
+        in_use_since = time.time() - self.grace
+
+        for last_used, size, path in sorted(blobs):
+            if last_used >= in_use_since or (last_used >= expired_before and total_size <= self.max_bytes):
+                break
+
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+        for ref_path in self.refs_dir.glob("*"):
+            try:
+                if not (self.blobs_dir / ref_path.read_text()).exists():
+                    ref_path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+
+
+artifact_store = ArtifactStore(
+    config.ARTIFACT_FOLDER,
+    max_bytes=config.ARTIFACT_MAX_BYTES,
+    ttl=config.ARTIFACT_TTL.total_seconds(),
+    grace=config.ARTIFACT_EVICTION_GRACE.total_seconds(),
+)
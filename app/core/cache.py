@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable
+
+import aiopg
+import psycopg2
+
+from app.core.config import config
+
+LOGGER = logging.getLogger(__name__)
+
+# Notified by triggers on `book_catalog` and `author`, see migrations/0006_catalog_notify.sql,
+# and with the SCHEMA_CHANGED payload by `apply_migrations`
+CATALOG_CHANNEL = "catalog_changed"
+SCHEMA_CHANGED = "schema"
+
+# Called when the schema may have changed, e.g. to drop the statements prepared for the old one
+schema_change_handlers: list[Callable[[], None]] = []
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Per-worker LRU cache whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        # Bumped by `clear`, so that values read before a change can't be stored after it
+        self.generation = 0
+
+        self._entries: OrderedDict[Any, tuple[Any, float]] = OrderedDict()
+
+    def get(self, key, default=None):
+        if (entry := self._entries.get(key)) is None:
+            return default
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, generation: int | None = None) -> None:
+        if generation is not None and generation != self.generation:
+            return
+
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+
+
+catalog_cache = TTLCache(config.CATALOG_CACHE_MAX_SIZE, config.CATALOG_CACHE_TTL.total_seconds())
+
+
+def cached(cache: TTLCache):
+    """Caches `async def func(cursor, *args)` by its name and arguments, the cursor isn't part of the key."""
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(cursor, *args):
+            key = (func.__name__, *args)
+
+            if (value := cache.get(key, _MISSING)) is not _MISSING:
+                return value
+
+            generation = cache.generation
+            value = await func(cursor, *args)
+            cache.set(key, value, generation)
+
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def handle_schema_change():
+    for handler in schema_change_handlers:
+        handler()
+
+
+def clear_catalog_cache():
+    """Clears the cache now and once more when the replicas have surely replayed the change.
+
+    The cached functions read from the cursor of the request, which may be on a replica that is still behind:
+    a value read there after the first clear would otherwise stay cached until it expires.
+    """
+
+    catalog_cache.clear()
+
+    if config.DATABASE_REPLICA_URLS:
+        # A replica in use is at most REPLICA_MAX_LAG behind, as of its last lag check
+        replica_delay = config.REPLICA_MAX_LAG + config.REPLICA_LAG_CHECK_INTERVAL
+        asyncio.get_running_loop().call_later(replica_delay.total_seconds(), catalog_cache.clear)
+
+
+async def listen_for_catalog_changes():
+    """Drops the cached catalog data as soon as a transaction changing it commits, whichever worker ran it."""
+
+    while True:
+        try:
+            async with aiopg.connect(config.DATABASE_URL, enable_hstore=False) as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(f"LISTEN {CATALOG_CHANNEL}")
+
+                clear_catalog_cache()  # whatever changed while nobody was listening
+                handle_schema_change()
+
+                while True:
+                    notification = await conn.notifies.get()
+                    clear_catalog_cache()
+                    if notification.payload == SCHEMA_CHANGED:
+                        handle_schema_change()
+        except (psycopg2.Error, OSError) as exc:
+            LOGGER.warning(f"Listening for catalog changes failed: {exc}. Reconnecting.")
+        except Exception:
+            # Nobody awaits the listener, whatever it dies of the cache would go stale silently
+            LOGGER.exception("Listening for catalog changes failed unexpectedly. Reconnecting.")
+
+        clear_catalog_cache()
+        await asyncio.sleep(config.CATALOG_CACHE_RECONNECT_INTERVAL.total_seconds())
+
+
+_listener: asyncio.Task | None = None
+
+
+def start_cache_invalidation():
+    global _listener
+
+    _listener = asyncio.create_task(listen_for_catalog_changes())
+
+
+async def stop_cache_invalidation():
+    if _listener is None:
+        return
+
+    _listener.cancel()
+    try:
+        await _listener
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,28 @@
+import aiopg
+from fastapi import Depends, Request, Response
+
+from app.core.exceptions import NotModifiedException
+from app.crud.aio import get_async_cursor, get_catalog_version
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+
+    return "*" in candidates or etag in candidates
+
+
+async def check_catalog_etag(
+    request: Request, response: Response, cursor: aiopg.Cursor = Depends(get_async_cursor)
+) -> None:
+    """Answers `304 Not Modified` when the client already has the current catalog version of the resource.
+
+    The version changes on any catalog write, so a response only depends on it and on its URL.
+    """
+
+    etag = f'"catalog-{await get_catalog_version(cursor)}"'
+
+    if (if_none_match := request.headers.get("if-none-match")) and etag_matches(etag, if_none_match):
+        raise NotModifiedException(etag=etag)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
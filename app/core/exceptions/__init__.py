@@ -1,17 +1,35 @@
+from .analytics import (
+    ReportExpiredException,
+    ReportFailedException,
+    ReportNotReadyException,
+)
 from .base import (
     BadRequestException,
     BaseHTTPException,
     ForbiddenException,
     NotFoundException,
+    NotModifiedException,
     UnauthorizedException,
 )
 from .book import (
+    BookImportFinishedException,
+    InvalidAuthorsException,
+    InvalidBookIdsException,
+    InvalidCursorException,
+    InvalidSortException,
     NoRequestedBooksException,
     TooManyBooksException,
     UnavailableBooksException,
     UploadBooksException,
 )
-from .db import DatabaseException, TableNotExistsException
+from .db import (
+    CompressionUnavailableException,
+    DatabaseException,
+    DatabaseUnavailableException,
+    DeltaExportUnavailableException,
+    ExportBusyException,
+    TableNotExistsException,
+)
 from .order import InvalidOrderStatusException
 from .token import (
     DecodeTokenException,
@@ -31,6 +49,7 @@ __all__ = [
     "BadRequestException",
     "ForbiddenException",
     "NotFoundException",
+    "NotModifiedException",
     "UnauthorizedException",
     # token
     "DecodeTokenException",
@@ -43,12 +62,25 @@ __all__ = [
     "UserNotFoundException",
     # order
     "InvalidOrderStatusException",
+    # analytics
+    "ReportExpiredException",
+    "ReportFailedException",
+    "ReportNotReadyException",
     # book
+    "BookImportFinishedException",
+    "InvalidAuthorsException",
+    "InvalidBookIdsException",
+    "InvalidCursorException",
+    "InvalidSortException",
     "NoRequestedBooksException",
     "TooManyBooksException",
     "UnavailableBooksException",
     "UploadBooksException",
     # db
+    "CompressionUnavailableException",
     "DatabaseException",
+    "DatabaseUnavailableException",
+    "DeltaExportUnavailableException",
+    "ExportBusyException",
     "TableNotExistsException",
 ]
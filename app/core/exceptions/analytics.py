@@ -0,0 +1,17 @@
+from app.core.exceptions.base import (
+    BadRequestException,
+    BaseHTTPException,
+    NotFoundException,
+)
+
+
+class ReportNotReadyException(BadRequestException):
+    description = "The report is not generated yet, check the status of the job."
+
+
+class ReportExpiredException(NotFoundException):
+    description = "The report was removed, generate a new one."
+
+
+class ReportFailedException(BaseHTTPException):
+    description = "The report could not be generated."
@@ -30,3 +30,12 @@ class ForbiddenException(BaseHTTPException):
 class NotFoundException(BaseHTTPException):
     code = HTTPStatus.NOT_FOUND
     description = HTTPStatus.NOT_FOUND.description
+
+
+class NotModifiedException(BaseHTTPException):
+    code = HTTPStatus.NOT_MODIFIED
+    description = HTTPStatus.NOT_MODIFIED.description
+
+    def __init__(self, etag: str) -> None:
+        self.headers = {"ETag": etag}
+        super().__init__()
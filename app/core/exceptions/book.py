@@ -17,3 +17,23 @@ class UploadBooksException(BaseHTTPException):
 
 class TooManyBooksException(BadRequestException):
     description = "You can't have more than 3 books at the time."
+
+
+class InvalidCursorException(BadRequestException):
+    description = "Invalid pagination cursor. Use the X-Next-Cursor header of the previous page with the same sorting."
+
+
+class InvalidSortException(BadRequestException):
+    description = "Books can be sorted by relevance only when searching."
+
+
+class InvalidAuthorsException(BadRequestException):
+    description = "Authors must be comma separated author ids. Example: 1,3"
+
+
+class InvalidBookIdsException(BadRequestException):
+    description = "Book ids must be comma separated, at most 100 of them. Example: 1,2,3"
+
+
+class BookImportFinishedException(BadRequestException):
+    description = "The import is finished already, there is nothing to resume."
@@ -1,3 +1,5 @@
+from http import HTTPStatus
+
 from app.core.exceptions import BadRequestException, BaseHTTPException
 
 
@@ -5,7 +7,27 @@ class DatabaseException(BaseHTTPException):
     description = "Database Operation failed. We're working on that issue."
 
 
+class DatabaseUnavailableException(BaseHTTPException):
+    code = HTTPStatus.SERVICE_UNAVAILABLE
+    description = "All database connections are busy. Try again later."
+
+
+class ExportBusyException(BaseHTTPException):
+    code = HTTPStatus.SERVICE_UNAVAILABLE
+    description = "Too many full exports are running. Try again later."
+
+
 class TableNotExistsException(BadRequestException):
     def __init__(self, table_name: str) -> None:
         self.description = f"Table with {table_name=} doesn't exist.'"
         super().__init__()
+
+
+class CompressionUnavailableException(BadRequestException):
+    def __init__(self, compression: str) -> None:
+        self.description = f"{compression} compression isn't available, leave it out or pick another one."
+        super().__init__()
+
+
+class DeltaExportUnavailableException(BaseHTTPException):
+    description = "Delta exports need the pg_read_all_stats role for the database user, ask the administrator."
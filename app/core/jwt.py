@@ -2,8 +2,7 @@ import datetime as dt
 import functools
 
 import jwt
-import psycopg2.extensions
-from fastapi import Depends, Header
+from fastapi import Depends, Header, Request
 
 from app.core.config import config
 from app.core.exceptions import (
@@ -12,7 +11,7 @@ from app.core.exceptions import (
     InvalidAuthorizationTypeException,
     NotFoundException,
 )
-from app.crud import get_cursor, get_user_object
+from app.crud.aio import get_user_by_email, request_async_cursor
 
 
 def _get_authorization_token(authorization: str = Header(...)):
@@ -27,24 +26,20 @@ def _get_authorization_token(authorization: str = Header(...)):
     return token
 
 
-def get_current_user(
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
-    token: str = Depends(_get_authorization_token),
-):  
-    
+async def get_current_user(request: Request, token: str = Depends(_get_authorization_token)):
     payload = decode_access_token(token)
     user_email = payload["email"]
-    print(f"Execute query: {'SELECT id, email, first_name, last_name, role FROM user_ WHERE email = '}{user_email}")
-    cursor.execute("""SELECT id, email, first_name, last_name, role FROM user_ WHERE email = %s""", (user_email,))
 
-    user_item = cursor.fetchone()
+    # Not a dependency: the connection is returned before the handler runs, sync handlers take one of their own
+    async with request_async_cursor(request) as cursor:
+        user = await get_user_by_email(cursor, user_email)
 
-    print(f"Result user: {user_item}")
-    if not user_item:
+    print(f"Result user: {user}")
+    if not user:
         print(f"No user was found")
         raise NotFoundException
 
-    return get_user_object(user_item)
+    return user
 
 
 def encode_access_token(user_email: str):
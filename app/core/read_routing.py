@@ -0,0 +1,53 @@
+import hashlib
+
+import redis.asyncio as redis
+from fastapi import Request
+
+from app.core.config import config
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+redis_client = redis.from_url(config.REDIS_URL or config.CELERY_BROKER_URL)
+
+
+def _get_writer_key(request: Request) -> str | None:
+    """Clients are told apart by their access token, anonymous clients can't write anything worth reading back."""
+
+    if not (authorization := request.headers.get("authorization")):
+        return None
+
+    return f"read-your-writes:{hashlib.sha256(authorization.encode()).hexdigest()}"
+
+
+async def _wrote_recently(request: Request) -> bool:
+    if (key := _get_writer_key(request)) is None:
+        return False
+
+    try:
+        return bool(await redis_client.exists(key))
+    except redis.RedisError:
+        return True  # can't tell, the primary is always up to date
+
+
+async def is_read_only(request: Request) -> bool:
+    """Safe requests may be served by a replica, unless the same client wrote something a moment ago."""
+
+    if not hasattr(request.state, "read_only"):
+        request.state.read_only = (
+            bool(config.DATABASE_REPLICA_URLS) and request.method in SAFE_METHODS and not await _wrote_recently(request)
+        )
+
+    return request.state.read_only
+
+
+async def remember_write(request: Request):
+    if not config.DATABASE_REPLICA_URLS or request.method in SAFE_METHODS:
+        return
+
+    if (key := _get_writer_key(request)) is None:
+        return
+
+    try:
+        await redis_client.set(key, 1, px=int(config.READ_YOUR_WRITES_WINDOW.total_seconds() * 1000))
+    except redis.RedisError:
+        pass
@@ -0,0 +1,51 @@
+import json
+from typing import Any, Iterable
+
+import anyio
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional, only makes encoding faster
+    orjson = None
+
+
+class RawJSONResponse(Response):
+    """Sends JSON that is serialized already, e.g. by Postgres, without decoding and encoding it again."""
+
+    media_type = "application/json"
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class, encodes with orjson when it is installed and skips the whitespace otherwise."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """Closes the streams its body is read from once the response is over, also when the client goes away.
+
+    Starlette leaves an unfinished body to the garbage collector, while a stream out of the database has to stop
+    using its connection before the dependencies return the connection to the pool. `closing` defaults to the body.
+    """
+
+    def __init__(self, content: Any, *args, closing: Iterable[Any] | None = None, **kwargs) -> None:
+        super().__init__(content, *args, **kwargs)
+        self.closing = list(closing) if closing is not None else [content]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                for stream in self.closing:
+                    if hasattr(stream, "aclose"):
+                        await stream.aclose()
+                    elif hasattr(stream, "close"):
+                        await run_in_threadpool(stream.close)
@@ -1,19 +1,45 @@
+from .analytics import begin_report_snapshot, get_report_job, get_report_version, set_report_job_status
 from .book import (
+    count_all_books,
+    count_books_by_title,
+    count_filtered_books,
+    checkpoint_book_import_job,
+    create_book_import_job,
     filter_books,
     get_all_books,
     get_available_books,
+    get_book_facets,
     get_book_filters,
+    get_book_import_job,
     get_books_from_ids,
     get_books_taken_by_user,
     get_one_book,
     get_unavailable_books,
+    get_unavailable_books_from_ids,
     get_user_book_list,
     get_books_by_title,
     update_book_status,
     delete_book,
-    get_authors
+    get_authors,
+    import_books,
+    refresh_book_catalog,
+    lend_order_books,
+    lock_book_import_job,
+    set_book_import_job_status,
+    stream_all_books,
+    stream_filtered_books,
+)
+from .db import (
+    begin_delta_export,
+    copy_delta,
+    get_cursor,
+    get_streaming_cursor,
+    get_table_names,
+    stream_copy,
+    stream_table_to_csv,
+    SnapshotExport,
+    WriteStream,
 )
-from .db import export_table_to_csv, get_cursor, get_table_names
 from .user import (
     delete_user,
     get_user,
@@ -24,24 +50,50 @@ from .user import (
 )
 
 __all__ = [
+    # analytics
+    "begin_report_snapshot",
+    "get_report_job",
+    "get_report_version",
+    "set_report_job_status",
     # book
+    "count_all_books",
+    "count_books_by_title",
+    "count_filtered_books",
+    "checkpoint_book_import_job",
+    "create_book_import_job",
     "filter_books",
     "get_all_books",
     "get_available_books",
+    "get_book_facets",
     "get_book_filters",
+    "get_book_import_job",
     "get_books_from_ids",
     "get_books_taken_by_user",
     "get_one_book",
     "get_unavailable_books",
+    "get_unavailable_books_from_ids",
     "get_user_book_list",
     "get_books_by_title",
     "update_book_status",
     "get_authors",
+    "import_books",
     "delete_book",
+    "refresh_book_catalog",
+    "lend_order_books",
+    "lock_book_import_job",
+    "set_book_import_job_status",
+    "stream_all_books",
+    "stream_filtered_books",
     # db
-    "export_table_to_csv",
     "get_cursor",
+    "get_streaming_cursor",
+    "begin_delta_export",
+    "copy_delta",
     "get_table_names",
+    "stream_copy",
+    "stream_table_to_csv",
+    "SnapshotExport",
+    "WriteStream",
     # user
     "delete_user",
     "get_user",
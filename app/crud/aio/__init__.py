@@ -0,0 +1,79 @@
+"""Asyncio versions of the `app.crud` functions, for `async def` route handlers."""
+
+from .analytics import get_report_job, get_report_version, start_report_job
+from .book import (
+    count_all_books,
+    count_books_by_title,
+    count_filtered_books,
+    delete_book,
+    filter_books,
+    filter_books_json,
+    get_all_books,
+    get_all_books_json,
+    get_authors,
+    get_available_books,
+    get_book_facets,
+    get_book_filters,
+    get_books_by_order,
+    get_books_by_title,
+    get_books_from_ids,
+    get_books_from_ids_json,
+    get_books_taken_by_user,
+    get_catalog_version,
+    get_one_book,
+    get_unavailable_books,
+    get_user_book_list,
+    get_user_book_list_json,
+    update_book_status,
+)
+from .db import get_async_cursor, primary_async_cursor, request_async_cursor
+from .user import (
+    delete_user,
+    get_user,
+    get_user_by_email,
+    get_users,
+    get_users_except_admins,
+    insert_user,
+)
+
+__all__ = [
+    # analytics
+    "get_report_job",
+    "get_report_version",
+    "start_report_job",
+    # book
+    "count_all_books",
+    "count_books_by_title",
+    "count_filtered_books",
+    "delete_book",
+    "filter_books",
+    "filter_books_json",
+    "get_all_books",
+    "get_all_books_json",
+    "get_authors",
+    "get_available_books",
+    "get_book_facets",
+    "get_book_filters",
+    "get_catalog_version",
+    "get_books_by_order",
+    "get_books_by_title",
+    "get_books_from_ids",
+    "get_books_from_ids_json",
+    "get_books_taken_by_user",
+    "get_one_book",
+    "get_unavailable_books",
+    "get_user_book_list",
+    "get_user_book_list_json",
+    "update_book_status",
+    # db
+    "get_async_cursor",
+    "primary_async_cursor",
+    "request_async_cursor",
+    # user
+    "delete_user",
+    "get_user",
+    "get_user_by_email",
+    "get_users",
+    "get_users_except_admins",
+    "insert_user",
+]
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+import aiopg
+
+from app.crud.analytics import (
+    ACTIVE_REPORT_JOB_SQL,
+    CREATE_REPORT_JOB_SQL,
+    EXPIRE_REPORT_JOBS_SQL,
+    REPORT_JOB_SQL,
+    REPORT_VERSION_SQL,
+)
+from app.models import ReportJob, ReportStatus
+
+
+async def get_report_version(cursor: aiopg.Cursor) -> str:
+    await cursor.execute(REPORT_VERSION_SQL)
+
+    return (await cursor.fetchone())[0]
+
+
+async def get_report_job(cursor: aiopg.Cursor, job_id: int) -> ReportJob | None:
+    await cursor.execute(REPORT_JOB_SQL, (job_id,))
+
+    if job_item := await cursor.fetchone():
+        return ReportJob(**job_item)
+
+    return None
+
+
+async def start_report_job(cursor: aiopg.Cursor, timeout: timedelta) -> tuple[ReportJob, bool]:
+    """Creates a pending job unless one is pending or running already.
+
+    Returns the job and whether it was created, only a created job has to be sent to the worker.
+    """
+
+    await cursor.execute(
+        EXPIRE_REPORT_JOBS_SQL, (ReportStatus.FAILED, ReportStatus.PENDING, ReportStatus.RUNNING, timeout)
+    )
+
+    while True:
+        await cursor.execute(CREATE_REPORT_JOB_SQL, (ReportStatus.PENDING,))
+        if job_item := await cursor.fetchone():
+            return ReportJob(**job_item), True
+
+        await cursor.execute(ACTIVE_REPORT_JOB_SQL, (ReportStatus.PENDING, ReportStatus.RUNNING))
+        if job_item := await cursor.fetchone():
+            return ReportJob(**job_item), False
+        # the active job finished in between
@@ -0,0 +1,171 @@
+from datetime import datetime, timezone
+
+import aiopg
+
+from app.core.cache import cached, catalog_cache
+from app.crud.aio.db import execute_prepared
+from app.crud.book import (
+    ALL_BOOKS_SQL,
+    AVAILABLE_BOOKS_LIST_SQL,
+    BOOK_FILTERS_AUTHORS_SQL,
+    BOOK_FILTERS_PAGES_NUM_RANGE_SQL,
+    BOOKS_BY_ORDER_SQL,
+    BOOKS_FROM_IDS_SQL,
+    BOOKS_TAKEN_BY_USER_SQL,
+    CATALOG_VERSION_SQL,
+    DELETE_BOOK_SQL,
+    ONE_BOOK_SQL,
+    UNAVAILABLE_BOOKS_LIST_SQL,
+    UPDATE_BOOK_STATUS_SQL,
+    USER_BOOK_LIST_SQL,
+    build_book_list_json_query,
+    build_facets_query,
+    build_filter_query,
+    get_author_object,
+    get_book_list_json_object,
+    get_book_object,
+    get_facets_object,
+    get_filters_object,
+    get_pages_num_range_object,
+    paginate_query,
+)
+from app.models import Author, Book, BookFacets, BookFilters, BookListJSON, BookPage
+
+
+async def get_one_book(cursor: aiopg.Cursor, book_id: int) -> Book | None:
+    await execute_prepared(cursor, ONE_BOOK_SQL, (book_id,))
+
+    if book_item := await cursor.fetchone():
+        return get_book_object(book_item)
+
+    return None
+
+
+async def _get_books(cursor: aiopg.Cursor, sql, params: tuple = tuple()) -> list[Book]:
+    await execute_prepared(cursor, sql, params)
+
+    book_items = await cursor.fetchall()
+
+    return list(map(get_book_object, book_items)) if book_items else []
+
+
+async def _get_books_json(
+    cursor: aiopg.Cursor, sql, params: tuple = tuple(), page: BookPage | None = None
+) -> BookListJSON:
+    """Same as `_get_books`, but Postgres builds the JSON of the whole list, for the hot list endpoints."""
+
+    await execute_prepared(cursor, build_book_list_json_query(sql, page), params)
+
+    return get_book_list_json_object(await cursor.fetchone())
+
+
+async def _count_books(cursor: aiopg.Cursor, sql, params: tuple = tuple()) -> int:
+    await execute_prepared(cursor, f"SELECT COUNT(*) FROM ({sql}) book", params)
+
+    return (await cursor.fetchone())[0]
+
+
+@cached(catalog_cache)
+async def get_authors(cursor: aiopg.Cursor) -> list[Author]:
+    await cursor.execute(BOOK_FILTERS_AUTHORS_SQL)
+
+    return list(map(get_author_object, await cursor.fetchall()))
+
+
+@cached(catalog_cache)
+async def get_book_filters(cursor: aiopg.Cursor) -> BookFilters:
+    authors = await get_authors(cursor)
+
+    await cursor.execute(BOOK_FILTERS_PAGES_NUM_RANGE_SQL)
+
+    page_num_range = get_pages_num_range_object(await cursor.fetchone())
+
+    return get_filters_object(authors, page_num_range)
+
+
+async def get_all_books(cursor: aiopg.Cursor, page: BookPage | None = None) -> list[Book]:
+    return await _get_books(cursor, *paginate_query(ALL_BOOKS_SQL, (), page))
+
+
+async def get_all_books_json(cursor: aiopg.Cursor, page: BookPage | None = None) -> BookListJSON:
+    return await _get_books_json(cursor, *paginate_query(ALL_BOOKS_SQL, (), page), page)
+
+
+async def count_all_books(cursor: aiopg.Cursor) -> int:
+    return await _count_books(cursor, ALL_BOOKS_SQL)
+
+
+async def get_books_by_title(cursor: aiopg.Cursor, search_term: str, page: BookPage | None = None) -> list[Book]:
+    return await filter_books(cursor, {}, page, search_term)
+
+
+async def count_books_by_title(cursor: aiopg.Cursor, search_term: str) -> int:
+    return await count_filtered_books(cursor, {}, search_term)
+
+
+async def get_book_facets(cursor: aiopg.Cursor, search_params: dict, search_term: str | None = None) -> BookFacets:
+    await execute_prepared(cursor, *build_facets_query(search_params, search_term))
+
+    return get_facets_object(await cursor.fetchall())
+
+
+async def get_books_from_ids(cursor: aiopg.Cursor, book_ids: list[int], with_deleted: bool = True) -> list[Book]:
+    return await _get_books(cursor, BOOKS_FROM_IDS_SQL, (book_ids, with_deleted))
+
+
+async def get_books_from_ids_json(cursor: aiopg.Cursor, book_ids: list[int], with_deleted: bool = True) -> BookListJSON:
+    return await _get_books_json(cursor, BOOKS_FROM_IDS_SQL, (book_ids, with_deleted))
+
+
+async def get_books_by_order(cursor: aiopg.Cursor, order_id: int) -> list[Book]:
+    return await _get_books(cursor, BOOKS_BY_ORDER_SQL, (order_id,))
+
+
+async def filter_books(
+    cursor: aiopg.Cursor, search_params: dict, page: BookPage | None = None, search_term: str | None = None
+) -> list[Book]:
+    return await _get_books(cursor, *paginate_query(*build_filter_query(search_params, search_term), page))
+
+
+async def filter_books_json(
+    cursor: aiopg.Cursor, search_params: dict, page: BookPage | None = None, search_term: str | None = None
+) -> BookListJSON:
+    return await _get_books_json(cursor, *paginate_query(*build_filter_query(search_params, search_term), page), page)
+
+
+async def count_filtered_books(cursor: aiopg.Cursor, search_params: dict, search_term: str | None = None) -> int:
+    return await _count_books(cursor, *build_filter_query(search_params, search_term))
+
+
+async def get_unavailable_books(cursor: aiopg.Cursor) -> list[Book]:
+    return await _get_books(cursor, UNAVAILABLE_BOOKS_LIST_SQL)
+
+
+async def get_available_books(cursor: aiopg.Cursor) -> list[Book]:
+    return await _get_books(cursor, AVAILABLE_BOOKS_LIST_SQL)
+
+
+async def get_user_book_list(cursor: aiopg.Cursor, user_id: int) -> list[Book]:
+    return await _get_books(cursor, USER_BOOK_LIST_SQL, (user_id,))
+
+
+async def get_user_book_list_json(cursor: aiopg.Cursor, user_id: int) -> BookListJSON:
+    return await _get_books_json(cursor, USER_BOOK_LIST_SQL, (user_id,))
+
+
+async def update_book_status(cursor: aiopg.Cursor, book_id: int):
+    await cursor.execute(UPDATE_BOOK_STATUS_SQL, (datetime.now(tz=timezone.utc), book_id, book_id))
+
+
+async def get_books_taken_by_user(cursor: aiopg.Cursor, user_id: int) -> list[Book]:
+    return await _get_books(cursor, BOOKS_TAKEN_BY_USER_SQL, (user_id,))
+
+
+async def delete_book(cursor: aiopg.Cursor, book_id: int):
+    await cursor.execute(DELETE_BOOK_SQL, (book_id,))
+
+
+async def get_catalog_version(cursor: aiopg.Cursor) -> int:
+    await execute_prepared(cursor, CATALOG_VERSION_SQL)
+
+    return (await cursor.fetchone())[0]
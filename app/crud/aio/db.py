@@ -0,0 +1,59 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiopg
+import psycopg2.extras
+from fastapi import Request
+
+from app.core.read_routing import is_read_only
+from app.crud.db import (
+    discard_prepared_statements,
+    get_execute_statement,
+    prepare_statement,
+)
+from app.db import get_async_connection, release_async_connection
+
+
+async def get_async_cursor(request: Request) -> AsyncIterator[aiopg.Cursor]:
+    async with request_async_cursor(request) as cursor:
+        yield cursor
+
+
+@asynccontextmanager
+async def request_async_cursor(request: Request) -> AsyncIterator[aiopg.Cursor]:
+    """Same cursor as `get_async_cursor`, but its connection goes back to the pool at the end of the block."""
+
+    conn = await get_async_connection(readonly=await is_read_only(request))
+    request.state.db_used = True
+    cursor = await conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+        await release_async_connection(conn)
+
+
+@asynccontextmanager
+async def primary_async_cursor() -> AsyncIterator[aiopg.Cursor]:
+    """A cursor on the primary for the duration of the block, for state that replicas may not have caught up with."""
+
+    conn = await get_async_connection()
+    cursor = await conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+        await release_async_connection(conn)
+
+
+async def execute_prepared(cursor: aiopg.Cursor, sql: str, params: tuple = tuple()):
+    name, setup = prepare_statement(cursor.connection, sql)
+
+    try:
+        for statement in setup:
+            await cursor.execute(statement)
+
+        await cursor.execute(get_execute_statement(name, params), params)
+    except psycopg2.Error:
+        discard_prepared_statements(cursor.connection)  # also when the statement was prepared for an older schema
+        raise
@@ -0,0 +1,51 @@
+import aiopg
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.exceptions import DatabaseException
+from app.core.security import Hasher
+from app.crud.user import DELETE_USER_SQL, INSERT_USER_SQL, USER_SQL, get_user_object
+from app.models import UserCreateModel, UserResponseModelExtended, UserRole
+
+
+async def get_user(cursor: aiopg.Cursor, user_id: int) -> UserResponseModelExtended | None:
+    await cursor.execute(f"""{USER_SQL} WHERE id = %s""", (user_id,))
+    if user_item := await cursor.fetchone():
+        return get_user_object(user_item)
+
+    return None
+
+
+async def get_user_by_email(cursor: aiopg.Cursor, email: str) -> UserResponseModelExtended | None:
+    await cursor.execute(f"""{USER_SQL} WHERE email = %s""", (email,))
+    if user_item := await cursor.fetchone():
+        return get_user_object(user_item)
+
+    return None
+
+
+async def get_users_except_admins(cursor: aiopg.Cursor) -> list[UserResponseModelExtended]:
+    await cursor.execute(f"""{USER_SQL} WHERE role != %s""", (UserRole.ADMIN,))
+
+    return list(map(get_user_object, await cursor.fetchall()))
+
+
+async def get_users(cursor: aiopg.Cursor) -> list[UserResponseModelExtended]:
+    await cursor.execute(USER_SQL)
+
+    return list(map(get_user_object, await cursor.fetchall()))
+
+
+async def insert_user(cursor: aiopg.Cursor, user: UserCreateModel, role: int = UserRole.READER):
+    # bcrypt is deliberately slow, keep it off the event loop
+    password_hash = await run_in_threadpool(Hasher.get_password_hash, user.password)
+
+    await cursor.execute(INSERT_USER_SQL, (user.email, user.first_name, user.last_name, password_hash, role))
+
+    if not (user_item := await cursor.fetchone()):
+        raise DatabaseException
+
+    return user_item["id"]
+
+
+async def delete_user(cursor: aiopg.Cursor, user_id: int):
+    await cursor.execute(DELETE_USER_SQL, (user_id,))
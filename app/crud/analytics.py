@@ -0,0 +1,72 @@
+import psycopg2.extensions
+
+from app.crud.db import BEGIN_SNAPSHOT_SQL
+from app.models import ReportJob, ReportStatus
+
+REPORT_JOB_COLUMNS = "id, status, artifact, error, created_at, updated_at"
+
+REPORT_JOB_SQL = f"""SELECT {REPORT_JOB_COLUMNS} FROM report_job WHERE id = %s"""
+
+ACTIVE_REPORT_JOB_SQL = f"""SELECT {REPORT_JOB_COLUMNS} FROM report_job WHERE status IN (%s, %s)"""
+
+# Conflicts with the pending or running job when there is one, see migrations/0011_report_job.sql
+CREATE_REPORT_JOB_SQL = f"""
+    INSERT INTO report_job (status) VALUES (%s) ON CONFLICT DO NOTHING RETURNING {REPORT_JOB_COLUMNS}
+"""
+
+# Fails jobs whose worker died, so that they do not keep new reports from being started
+EXPIRE_REPORT_JOBS_SQL = """
+    UPDATE report_job SET status = %s, error = 'Timed out', updated_at = NOW()
+    WHERE status IN (%s, %s) AND updated_at < NOW() - %s
+"""
+
+SET_REPORT_JOB_STATUS_SQL = """
+    UPDATE report_job SET status = %s, artifact = %s, error = %s, updated_at = NOW() WHERE id = %s
+"""
+
+
+# Moves whenever the data of the report may have changed: new orders and offenders, returned books, renamed books
+# and deleted rows. Each part is read from the end of an index.
+REPORT_VERSION_SQL = """
+    SELECT concat_ws(
+        ':',
+        (SELECT MAX(id) FROM book_order),
+        (SELECT EXTRACT(EPOCH FROM MAX(updated_at)) FROM book_order),
+        (SELECT EXTRACT(EPOCH FROM MAX(updated_at)) FROM book),
+        (SELECT MAX(id) FROM offender),
+        (SELECT MAX(id) FROM row_tombstone)
+    )
+"""
+
+
+def get_report_version(cursor: psycopg2.extensions.cursor) -> str:
+    cursor.execute(REPORT_VERSION_SQL)
+
+    return cursor.fetchone()[0]  # type: ignore
+
+
+def begin_report_snapshot(cursor: psycopg2.extensions.cursor) -> str:
+    """Starts a read-only snapshot and returns the version of the data it sees. Call it first in a transaction."""
+
+    cursor.execute(BEGIN_SNAPSHOT_SQL)
+
+    return get_report_version(cursor)
+
+
+def get_report_job(cursor: psycopg2.extensions.cursor, job_id: int) -> ReportJob | None:
+    cursor.execute(REPORT_JOB_SQL, (job_id,))
+
+    if job_item := cursor.fetchone():
+        return ReportJob(**job_item)  # type: ignore
+
+    return None
+
+
+def set_report_job_status(
+    cursor: psycopg2.extensions.cursor,
+    job_id: int,
+    status: ReportStatus,
+    artifact: str | None = None,
+    error: str | None = None,
+):
+    cursor.execute(SET_REPORT_JOB_STATUS_SQL, (status, artifact, error, job_id))
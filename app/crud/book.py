@@ -1,40 +1,43 @@
+import uuid
 from datetime import datetime, timezone
+from typing import Iterator
 
 import psycopg2.extensions
 
-from app.models import Author, Book, OrderStatus, BookFilters, PageNumRange
+from app.core.config import config
+from app.crud.db import copy_rows, execute_prepared
+from app.models import (
+    Author,
+    AuthorFacet,
+    AvailabilityFacet,
+    Book,
+    BookFacets,
+    BookFilters,
+    BookImportJob,
+    BookImportResult,
+    BookImportStatus,
+    BookListJSON,
+    BookPage,
+    BookSort,
+    PageNumBucket,
+    PageNumRange,
+)
 
 BOOK_SQL = """
-    SELECT DISTINCT ON (book.title, book.isbn) book.id, book.title, book.isbn, book.num_pages, book.description, book.image_url, (
-        SELECT json_agg(json_build_array(a.id, a.first_name, a.last_name, a.origin)) AS authors
-        FROM book_author ba
-        JOIN author a on ba.author_id = a.id
-        JOIN book b ON ba.book_id = b.id
-        WHERE book.id = b.id
-    )
-    FROM book_author
-    JOIN book ON book_author.book_id = book.id
+    SELECT book.id, book.title, book.isbn, book.num_pages, book.description, book.image_url, book.authors
+    FROM book_catalog book
 """
 
+# Matches stemmed words of titles, author names and descriptions, and misspelled or unfinished title words through
+# trigram similarity. The russian configuration stems Latin words with the english stemmer, so it covers both.
 BOOK_SEARCH_SQL = """
-    SELECT DISTINCT ON (book.title, book.isbn) book.id, book.title, book.isbn, book.num_pages, book.description, book.image_url, (
-        SELECT json_agg(json_build_array(a.id, a.first_name, a.last_name, a.origin)) AS authors
-        FROM book_author ba
-        JOIN author a on ba.author_id = a.id
-        JOIN book b ON ba.book_id = b.id
-        WHERE book.id = b.id
-    )
-    FROM book_author
-    JOIN book ON book_author.book_id = book.id
-    WHERE UPPER(book.title) LIKE UPPER(%s) AND book.deleted_at IS NULL
-"""
-
-UNAVAILABLE_BOOKS_SQL = """
-    SELECT book.id
-    FROM book
-    JOIN book_order bo ON bo.book_id = book.id
-    JOIN order_ o ON bo.order_id = o.id
-    WHERE bo.date_finished IS NULL AND o.status = 2
+    SELECT book.id, book.title, book.isbn, book.num_pages, book.description, book.image_url, book.authors,
+        book.relevance
+    FROM (
+        SELECT book.*, ts_rank_cd(book.search_vector, query) + word_similarity(%s, book.title) AS relevance
+        FROM book_catalog book, websearch_to_tsquery('russian', %s) query
+        WHERE book.search_vector @@ query OR %s <%% book.title
+    ) book
 """
 
 BOOK_FILTERS_AUTHORS_SQL = """
@@ -47,6 +50,211 @@ BOOK_FILTERS_PAGES_NUM_RANGE_SQL = """
     FROM book
 """
 
+ONE_BOOK_SQL = f"""{BOOK_SQL} WHERE book.id = %s AND book.deleted_at is NULL"""
+
+ALL_BOOKS_SQL = f"""{BOOK_SQL} WHERE book.deleted_at is NULL"""
+
+# Looks the books up by primary key and keeps the order of the ids
+BOOKS_FROM_IDS_SQL = """
+    SELECT book.id, book.title, book.isbn, book.num_pages, book.description, book.image_url, book.authors
+    FROM unnest(%s::bigint[]) WITH ORDINALITY ids(id, position)
+    JOIN book_catalog book ON book.id = ids.id
+    WHERE %s OR book.deleted_at IS NULL
+    ORDER BY ids.position
+"""
+
+BOOKS_BY_ORDER_SQL = f"""{BOOK_SQL} WHERE book.id IN (SELECT book_id FROM book_order WHERE order_id = %s)"""
+
+UNAVAILABLE_BOOKS_LIST_SQL = f"""
+    {BOOK_SQL}
+    WHERE book.loan_order_id IS NOT NULL
+    ORDER BY book.title, book.isbn
+"""
+
+UNAVAILABLE_BOOKS_FROM_IDS_SQL = f"""{BOOK_SQL} WHERE book.id = ANY(%s) AND book.loan_order_id IS NOT NULL"""
+
+AVAILABLE_BOOKS_LIST_SQL = f"""
+    {BOOK_SQL}
+    WHERE book.loan_order_id IS NULL AND book.deleted_at is NULL
+    ORDER BY book.title, book.isbn
+"""
+
+USER_BOOK_LIST_SQL = f"""{BOOK_SQL} WHERE book.borrower_id = %s ORDER BY book.title, book.isbn"""
+
+BOOKS_TAKEN_BY_USER_SQL = f"""
+    {BOOK_SQL}
+    JOIN book_order bo ON bo.book_id = book.id
+    JOIN order_ o ON bo.order_id = o.id
+    WHERE bo.date_finished IS NULL AND o.user_id = %s
+"""
+
+# Lending and returning touch `book` only, a trigger copies the loan to `book_catalog`
+UPDATE_BOOK_STATUS_SQL = """
+    WITH finished AS (
+        UPDATE book_order SET date_finished = %s WHERE book_id = %s AND date_finished IS NULL
+    )
+    UPDATE book SET loan_order_id = NULL, borrower_id = NULL WHERE id = %s
+"""
+
+# A join rather than `book.id IN (...)` correlated with `o`, which Postgres checks for every row of `book`
+LEND_ORDER_BOOKS_SQL = """
+    UPDATE book SET loan_order_id = o.id, borrower_id = o.user_id
+    FROM order_ o
+    JOIN book_order bo ON bo.order_id = o.id
+    WHERE o.id = %s AND book.id = bo.book_id AND book.loan_order_id IS NULL
+    RETURNING book.id
+"""
+
+# One statement, so that it stays atomic on autocommit (async) connections too
+DELETE_BOOK_SQL = """
+    WITH deleted AS (
+        UPDATE book SET deleted_at=NOW() WHERE id = %s RETURNING id, deleted_at
+    )
+    UPDATE book_catalog SET deleted_at = deleted.deleted_at FROM deleted WHERE book_catalog.id = deleted.id
+"""
+
+# Lower bounds of the page number buckets after the first one, which starts at 0
+PAGE_BUCKET_BOUNDS = [100, 200, 300, 500, 1000]
+
+# All facets in one pass over the matching books. GROUPING() tells the grouping sets apart, its bits are set
+# for the columns a row is not grouped by: 3 - per author, 5 - per page bucket, 6 - per availability, 7 - total.
+BOOK_FACETS_SQL = """
+    SELECT author_id, pages_bucket, available, GROUPING(author_id, pages_bucket, available) AS grouping_set,
+        COUNT(DISTINCT id) AS count
+    FROM (
+        SELECT book.id, author.id AS author_id, width_bucket(book.num_pages, %s::bigint[]) AS pages_bucket,
+            book.loan_order_id IS NULL AS available
+        FROM book_catalog book
+        LEFT JOIN LATERAL unnest(book.author_ids) author(id) ON TRUE
+        WHERE book.id IN (SELECT filtered.id FROM ({filter_query}) filtered)
+    ) facet
+    GROUP BY GROUPING SETS ((author_id), (pages_bucket), (available), ())
+    ORDER BY grouping_set, count DESC, author_id
+"""
+
+# Serializes a listing in Postgres, so that no `Book` objects are built for it. The order of a subquery doesn't
+# carry over to the aggregates, so they sort by the order of the listing themselves. The number of books and
+# the sort key of the last one are needed for the next cursor.
+BOOK_JSON_SQL = """
+    json_build_object(
+        'id', book.id, 'title', book.title, 'isbn', book.isbn, 'num_pages', book.num_pages,
+        'image_url', book.image_url, 'authors', book.authors, 'description', book.description
+    )
+"""
+
+BOOK_LIST_JSON_SQL = f"""
+    SELECT
+        COALESCE(json_agg({BOOK_JSON_SQL} ORDER BY {{order_by}}), '[]')::text AS content,
+        COUNT(*) AS count,
+        (array_agg(json_build_array({{sort_key}}) ORDER BY {{order_by}}))[COUNT(*)::int] AS last_sort_key
+    FROM ({{listing}}) book
+"""
+
+# One JSON document per book, for streaming
+BOOK_STREAM_SQL = f"""SELECT {BOOK_JSON_SQL}::text FROM ({{listing}}) book ORDER BY {{order_by}}"""
+
+# CSV import: the rows are copied into these tables first, then books, authors and links are resolved by a few
+# set-based statements, see `import_books`
+CREATE_BOOK_IMPORT_TABLES_SQL = """
+    CREATE TEMP TABLE book_import (
+        line INT PRIMARY KEY,
+        title TEXT NOT NULL,
+        isbn TEXT NOT NULL,
+        num_pages BIGINT NOT NULL,
+        book_id BIGINT
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE book_import_author (
+        line INT NOT NULL,
+        position INT NOT NULL,
+        first_name TEXT NOT NULL,
+        last_name TEXT NOT NULL,
+        origin TEXT NOT NULL
+    ) ON COMMIT DROP
+"""
+
+# Only the first occurrence of a book in the file is imported
+DELETE_REPEATED_IMPORT_BOOKS_SQL = """
+    DELETE FROM book_import
+    WHERE line NOT IN (SELECT DISTINCT ON (title, isbn) line FROM book_import ORDER BY title, isbn, line)
+"""
+
+INSERT_IMPORT_BOOKS_SQL = """
+    WITH inserted AS (
+        INSERT INTO book (title, isbn, num_pages)
+        SELECT title, isbn, num_pages FROM book_import ORDER BY line
+        ON CONFLICT (title, isbn) DO NOTHING
+        RETURNING id, title, isbn
+    )
+    UPDATE book_import SET book_id = inserted.id
+    FROM inserted
+    WHERE (book_import.title, book_import.isbn) = (inserted.title, inserted.isbn)
+    RETURNING book_import.book_id
+"""
+
+INSERT_IMPORT_AUTHORS_SQL = """
+    INSERT INTO author (first_name, last_name, origin)
+    SELECT DISTINCT author.first_name, author.last_name, author.origin
+    FROM book_import_author author
+    JOIN book_import book ON book.line = author.line
+    WHERE book.book_id IS NOT NULL
+    ON CONFLICT DO NOTHING
+"""
+
+INSERT_IMPORT_BOOK_AUTHORS_SQL = """
+    INSERT INTO book_author (book_id, author_id)
+    SELECT book.book_id, author.id
+    FROM book_import book
+    JOIN book_import_author import_author ON import_author.line = book.line
+    JOIN author ON (author.first_name, author.last_name, author.origin)
+        = (import_author.first_name, import_author.last_name, import_author.origin)
+    WHERE book.book_id IS NOT NULL
+    ORDER BY book.line, import_author.position
+"""
+
+DROP_BOOK_IMPORT_TABLES_SQL = """DROP TABLE book_import, book_import_author"""
+
+BOOK_IMPORT_JOB_SQL = """
+    SELECT id, filename, path, status, byte_offset, lines_processed, inserted, duplicates, rejected, error,
+        created_at, updated_at
+    FROM book_import_job
+    WHERE id = %s
+"""
+
+CREATE_BOOK_IMPORT_JOB_SQL = """
+    INSERT INTO book_import_job (user_id, filename, path, status) VALUES (%s, %s, %s, %s) RETURNING id
+"""
+
+SET_BOOK_IMPORT_JOB_STATUS_SQL = """
+    UPDATE book_import_job SET status = %s, error = %s, updated_at = NOW() WHERE id = %s
+"""
+
+CHECKPOINT_BOOK_IMPORT_JOB_SQL = """
+    UPDATE book_import_job SET
+        byte_offset = %s,
+        lines_processed = lines_processed + %s,
+        inserted = inserted + %s,
+        duplicates = duplicates + %s,
+        rejected = rejected + %s,
+        updated_at = NOW()
+    WHERE id = %s
+"""
+
+# Keeps two workers off the same job, e.g. when a resumed job is redelivered. Released with the connection.
+BOOK_IMPORT_LOCK_ID = 0x696D70  # "imp"
+LOCK_BOOK_IMPORT_JOB_SQL = """SELECT pg_try_advisory_lock(%s, %s)"""
+
+CATALOG_VERSION_SQL = """SELECT version FROM catalog_version"""
+
+REFRESH_BOOK_CATALOG_SQL = """SELECT refresh_book_catalog(%s::bigint[])"""
+
+# Every sort key ends with a unique column, so that it can be used as a keyset cursor
+BOOK_SORT_KEYS = {
+    BookSort.TITLE: ("title", "isbn"),
+    BookSort.NUM_PAGES: ("num_pages", "id"),
+    BookSort.ID: ("id",),
+    BookSort.RELEVANCE: ("relevance", "id"),
+}
+
 def get_book_object(book_item):
     authors = book_item["authors"]
 
@@ -56,12 +264,14 @@ def get_book_object(book_item):
         isbn=book_item["isbn"],
         num_pages=book_item["num_pages"],
         image_url=book_item["image_url"],
-        authors=[
-            Author(id=author[0], first_name=author[1], last_name=author[2], origin=author[3]) for author in authors
-        ],
-        description=book_item["description"]
+        authors=[Author(**author) for author in authors],
+        description=book_item["description"],
+        relevance=book_item.get("relevance"),
     )
 
+def get_book_list_json_object(item) -> BookListJSON:
+    return BookListJSON(content=item["content"], count=item["count"], last_sort_key=item["last_sort_key"])
+
 def get_author_object(author):
 
     return Author(
@@ -85,8 +295,36 @@ def get_filters_object(authors: list[Author], page_num_range: PageNumRange):
         num_pages=page_num_range
     )
 
+def get_facets_object(facet_items) -> BookFacets:
+    total = 0
+    author_counts = []
+    bucket_counts = dict.fromkeys(range(len(PAGE_BUCKET_BOUNDS) + 1), 0)
+    availability_counts = {True: 0, False: 0}
+
+    for item in facet_items:
+        if item["grouping_set"] == 3 and item["author_id"] is not None:
+            author_counts.append(AuthorFacet(id=item["author_id"], count=item["count"]))
+        elif item["grouping_set"] == 5:
+            bucket_counts[item["pages_bucket"]] = item["count"]
+        elif item["grouping_set"] == 6:
+            availability_counts[item["available"]] = item["count"]
+        elif item["grouping_set"] == 7:
+            total = item["count"]
+
+    bounds = [0, *PAGE_BUCKET_BOUNDS, None]
+
+    return BookFacets(
+        total=total,
+        author_counts=author_counts,
+        page_buckets=[
+            PageNumBucket(min=bounds[bucket], max=bounds[bucket + 1], count=count)
+            for bucket, count in bucket_counts.items()
+        ],
+        availability=AvailabilityFacet(available=availability_counts[True], unavailable=availability_counts[False]),
+    )
+
 def get_one_book(cursor: psycopg2.extensions.cursor, book_id: int) -> Book | None:
-    cursor.execute(f"""{BOOK_SQL} WHERE book.id = %s AND book.deleted_at is NULL""", (book_id,))
+    execute_prepared(cursor, ONE_BOOK_SQL, (book_id,))
 
     if book_item := cursor.fetchone():
         return get_book_object(book_item)
@@ -95,7 +333,7 @@ def get_one_book(cursor: psycopg2.extensions.cursor, book_id: int) -> Book | Non
 
 
 def _get_books(cursor: psycopg2.extensions.cursor, sql, params: tuple = tuple()) -> list[Book]:
-    cursor.execute(sql, params)
+    execute_prepared(cursor, sql, params)
 
     print(f"Executing SQL query: {sql} with params {params}")
 
@@ -105,6 +343,66 @@ def _get_books(cursor: psycopg2.extensions.cursor, sql, params: tuple = tuple())
 
     return list(map(get_book_object, book_items)) if book_items else []
 
+
+def _stream_books(
+    cursor: psycopg2.extensions.cursor, sql, params: tuple = tuple(), page: BookPage | None = None
+) -> Iterator[str]:
+    """Yields the books as JSON lines.
+
+    They are read through a server-side cursor, `BOOK_STREAM_BATCH_SIZE` rows at a time, so the memory used
+    doesn't grow with the catalog. The cursor lives in the transaction of the connection, don't commit it meanwhile.
+    """
+
+    with cursor.connection.cursor(name=f"book_stream_{uuid.uuid4().hex}") as stream:
+        stream.execute(BOOK_STREAM_SQL.format(listing=sql, order_by=get_order_by(page or BookPage())), params)
+
+        while book_items := stream.fetchmany(config.BOOK_STREAM_BATCH_SIZE):
+            for (book_json,) in book_items:
+                yield book_json + "\n"
+
+
+def paginate_query(sql: str, params: tuple, page: BookPage | None) -> tuple[str, tuple]:
+    """Sorts a listing and cuts a page out of it. `sql` has to end with its WHERE clause."""
+
+    page = page or BookPage()
+    sort_columns = [f"book.{column}" for column in BOOK_SORT_KEYS[page.sort]]
+
+    if page.after is not None:
+        placeholders = ", ".join(["%s"] * len(sort_columns))
+        sql += f" AND ({', '.join(sort_columns)}) {'<' if page.desc else '>'} ({placeholders})"
+        params += tuple(page.after)
+
+    sql += f" ORDER BY {get_order_by(page)}"
+
+    if page.limit is not None:
+        sql += " LIMIT %s"
+        params += (page.limit,)
+
+    return sql, params
+
+
+def get_order_by(page: BookPage) -> str:
+    direction = "DESC" if page.desc else "ASC"
+
+    return ", ".join(f"book.{column} {direction}" for column in BOOK_SORT_KEYS[page.sort])
+
+
+def build_book_list_json_query(sql: str, page: BookPage | None = None) -> str:
+    page = page or BookPage()
+    sort_key = ", ".join(f"book.{column}" for column in BOOK_SORT_KEYS[page.sort])
+
+    return BOOK_LIST_JSON_SQL.format(sort_key=sort_key, order_by=get_order_by(page), listing=sql)
+
+
+def get_sort_key(book: Book, sort: BookSort) -> list:
+    return [getattr(book, column) for column in BOOK_SORT_KEYS[sort]]
+
+
+def _count_books(cursor: psycopg2.extensions.cursor, sql, params: tuple = tuple()) -> int:
+    execute_prepared(cursor, f"SELECT COUNT(*) FROM ({sql}) book", params)
+
+    return cursor.fetchone()[0]  # type: ignore
+
 def get_authors(cursor: psycopg2.extensions.cursor) -> list[Author]:
     cursor.execute(BOOK_FILTERS_AUTHORS_SQL)
     fetched_authors = cursor.fetchall()
@@ -123,152 +421,221 @@ def _get_filters(cursor: psycopg2.extensions.cursor) -> BookFilters:
     return get_filters_object(authors, page_num_range)
 
 
-def get_all_books(cursor: psycopg2.extensions.cursor) -> list[Book]:
-    return _get_books(cursor, BOOK_SQL + "WHERE book.deleted_at is NULL")
+def get_all_books(cursor: psycopg2.extensions.cursor, page: BookPage | None = None) -> list[Book]:
+    return _get_books(cursor, *paginate_query(ALL_BOOKS_SQL, (), page))
+
+def stream_all_books(cursor: psycopg2.extensions.cursor, page: BookPage | None = None) -> Iterator[str]:
+    return _stream_books(cursor, *paginate_query(ALL_BOOKS_SQL, (), page), page)
+
+def count_all_books(cursor: psycopg2.extensions.cursor) -> int:
+    return _count_books(cursor, ALL_BOOKS_SQL)
+
+def get_books_by_title(
+    cursor: psycopg2.extensions.cursor, search_term: str | None, page: BookPage | None = None
+) -> list[Book]:
+    return filter_books(cursor, {}, page, search_term)
 
-def get_books_by_title(cursor: psycopg2.extensions.cursor, search_term: str | None) -> list[Book]:
-    return _get_books(cursor, BOOK_SEARCH_SQL, (f"%{search_term.strip().upper()}%",))
+def count_books_by_title(cursor: psycopg2.extensions.cursor, search_term: str | None) -> int:
+    return count_filtered_books(cursor, {}, search_term)
 
 def get_book_filters(cursor: psycopg2.extensions.cursor) -> BookFilters:
     return _get_filters(cursor)
 
-def get_books_from_ids(cursor: psycopg2.extensions.cursor, book_ids: list[int]) -> list[Book]:
-    sql = f"""
-        SELECT book.id, book.title, book.isbn, book.num_pages, book.authors, book.image_url, book.description
-        FROM ({BOOK_SQL}) AS book
-        WHERE book.id = ANY(%s)
-    """
-    params = (book_ids,)
+def build_facets_query(search_params: dict, search_term: str | None = None) -> tuple[str, tuple]:
+    filter_query, params = build_filter_query(search_params, search_term)
+
+    return BOOK_FACETS_SQL.format(filter_query=filter_query), (PAGE_BUCKET_BOUNDS, *params)
+
+def get_book_facets(
+    cursor: psycopg2.extensions.cursor, search_params: dict, search_term: str | None = None
+) -> BookFacets:
+    execute_prepared(cursor, *build_facets_query(search_params, search_term))
+
+    return get_facets_object(cursor.fetchall())
+
+def get_books_from_ids(
+    cursor: psycopg2.extensions.cursor, book_ids: list[int], with_deleted: bool = True
+) -> list[Book]:
+    """Deleted books are still needed to show old orders."""
 
-    return _get_books(cursor, sql, params)
+    return _get_books(cursor, BOOKS_FROM_IDS_SQL, (book_ids, with_deleted))
 
 def get_books_by_order(cursor: psycopg2.extensions.cursor, order_id: int) -> list[Book]:
-    sql = f"""
-        SELECT book.id, book.title, book.isbn, book.num_pages, book.authors, book.image_url, book.description
-        FROM ({BOOK_SQL}) AS book
-        WHERE book.id = (SELECT book_id FROM book_order WHERE order_id = %s)
+    return _get_books(cursor, BOOKS_BY_ORDER_SQL, (order_id,))
+
+
+class BookQuery:
+    """Composes book listings out of parameterized conditions.
+
+    Filter values never end up in the statement text, so every combination of filters in use is one statement
+    that Postgres plans once per connection (see `execute_prepared`).
     """
-    params = (order_id,)
 
-    return _get_books(cursor, sql, params)
+    def __init__(self, search_term: str | None = None) -> None:
+        if search_term:
+            self.sql = BOOK_SEARCH_SQL
+            self.params = [search_term] * 3
+        else:
+            self.sql = BOOK_SQL
+            self.params = []
 
+        self.conditions = ["book.deleted_at is NULL"]
 
-def filter_books(cursor: psycopg2.extensions.cursor, search_params: dict) -> list[Book]:
+    def where(self, condition: str, *params) -> "BookQuery":
+        self.conditions.append(condition)
+        self.params.extend(params)
 
-    unavailable_sql = """
-        SELECT book.id
-        FROM book
-        JOIN book_order bo ON bo.book_id = book.id
-        JOIN order_ o ON bo.order_id = o.id
-        WHERE bo.date_finished IS NULL AND o.status = 2 AND book.deleted_at IS NULL
-    """
+        return self
 
-    available_sql = f"""
-        SELECT book.id
-        FROM book
-        EXCEPT
-        {unavailable_sql}
-        WHERE book.deleted_at IS NULL
-    """
+    def build(self) -> tuple[str, tuple]:
+        return f"{self.sql} WHERE {' AND '.join(self.conditions)}", tuple(self.params)
+
+
+def build_filter_query(search_params: dict, search_term: str | None = None) -> tuple[str, tuple]:
+    """`search_params` may hold `availability`, `min`, `max` and `authors` (a list of author ids)."""
 
-    FILTER_QUERY = BOOK_SQL
-    is_available = None
+    query = BookQuery(search_term.strip() if search_term else None)
 
-    if search_params:
-        is_available = search_params.get("availability")
+    if (is_available := search_params.get("availability")) is not None:
+        query.where(f"book.loan_order_id {'IS NULL' if is_available else 'IS NOT NULL'}")
+    if search_params.get("min") is not None or search_params.get("max") is not None:
+        # One statement for either bound or both, an absent bound is NULL, which custom plans fold away
+        query.where(
+            "(%s::bigint IS NULL OR book.num_pages >= %s) AND (%s::bigint IS NULL OR book.num_pages <= %s)",
+            *[search_params.get("min")] * 2,
+            *[search_params.get("max")] * 2,
+        )
+    if search_params.get("authors"):
+        query.where("book.author_ids && %s::bigint[]", list(search_params["authors"]))
 
-        if is_available != None:
-            FILTER_QUERY = f"""
-                {BOOK_SQL}
-                JOIN (
-                    {available_sql if is_available else unavailable_sql}
-                ) AS sub ON book.id = sub.id
-            """
+    return query.build()
 
-        if "min" in search_params or "max" in search_params or "author" in search_params:
-            FILTER_QUERY = FILTER_QUERY + "\n WHERE "
 
-            query_params = []
+def filter_books(
+    cursor: psycopg2.extensions.cursor,
+    search_params: dict,
+    page: BookPage | None = None,
+    search_term: str | None = None,
+) -> list[Book]:
+    return _get_books(cursor, *paginate_query(*build_filter_query(search_params, search_term), page))
 
-            for key, value in search_params.items():
-                if isinstance(value, str):
-                    value = value.split(",")
-                if key == 'min':
-                    query_params.append(f"book.num_pages >= {value}")
-                elif key == 'max':
-                    query_params.append(f"book.num_pages <= {value}")
-                elif isinstance(value, list) and key == "authors":
-                    values_as_str = ",".join([f"{v}" for v in value])
-                    query_params.append(f"book_author.author_id IN ({values_as_str})")
-                elif not isinstance(value, list) and key == "authors":
-                    query_params.append(f"book_author.author_id = '{value}'")
 
-            FILTER_QUERY += " AND ".join(query_params)
-            FILTER_QUERY += " AND book.deleted_at is NULL"
+def stream_filtered_books(
+    cursor: psycopg2.extensions.cursor,
+    search_params: dict,
+    page: BookPage | None = None,
+    search_term: str | None = None,
+) -> Iterator[str]:
+    return _stream_books(cursor, *paginate_query(*build_filter_query(search_params, search_term), page), page)
 
-    return _get_books(cursor, FILTER_QUERY)
+
+def count_filtered_books(
+    cursor: psycopg2.extensions.cursor, search_params: dict, search_term: str | None = None
+) -> int:
+    return _count_books(cursor, *build_filter_query(search_params, search_term))
 
 
 def get_unavailable_books(cursor: psycopg2.extensions.cursor) -> list[Book]:
-    sql = f"""
-        {BOOK_SQL}
-        JOIN (
-            {UNAVAILABLE_BOOKS_SQL}
-        ) AS sub ON book.id = sub.id
-    """
-    return _get_books(cursor, sql)
+    return _get_books(cursor, UNAVAILABLE_BOOKS_LIST_SQL)
 
 
 def get_available_books(cursor: psycopg2.extensions.cursor) -> list[Book]:
-    sql = f"""
-        {BOOK_SQL}
-        JOIN (
-            SELECT book.id
-            FROM book
-            EXCEPT
-            {UNAVAILABLE_BOOKS_SQL}
-        ) AS sub ON book.id = sub.id
-        WHERE book.deleted_at is NULL
-    """
-    return _get_books(cursor, sql)
+    return _get_books(cursor, AVAILABLE_BOOKS_LIST_SQL)
+
+
+def get_unavailable_books_from_ids(cursor: psycopg2.extensions.cursor, book_ids: list[int]) -> list[Book]:
+    return _get_books(cursor, UNAVAILABLE_BOOKS_FROM_IDS_SQL, (book_ids,))
 
 
 def get_user_book_list(cursor: psycopg2.extensions.cursor, user_id: int) -> list[Book]:
-    sql = f"""
-        SELECT book.id, book.title, book.isbn, book.num_pages, book.authors, book.description
-        FROM ({BOOK_SQL}) AS book
-        JOIN book_order bo ON bo.book_id = book.id
-        JOIN order_ o ON bo.order_id = o.id
-        WHERE o.status = %s AND o.user_id = %s AND bo.date_finished IS NULL
+    return _get_books(cursor, USER_BOOK_LIST_SQL, (user_id,))
+
+
+def update_book_status(cursor: psycopg2.extensions.cursor, book_id: int):
+    cursor.execute(UPDATE_BOOK_STATUS_SQL, (datetime.now(tz=timezone.utc), book_id, book_id))
+
+
+def lend_order_books(cursor: psycopg2.extensions.cursor, order_id: int) -> list[int]:
+    """Lends the books of the order out to its user. Returns the ids of the books that were available."""
+
+    cursor.execute(LEND_ORDER_BOOKS_SQL, (order_id,))
+
+    return [record[0] for record in cursor.fetchall()]
+
+
+
+def get_books_taken_by_user(cursor: psycopg2.extensions.cursor, user_id: int) -> list[Book]:
+    return _get_books(cursor, BOOKS_TAKEN_BY_USER_SQL, (user_id,))
+
+def delete_book(cursor: psycopg2.extensions.cursor, book_id: int):
+    cursor.execute(DELETE_BOOK_SQL, (book_id,))
+
+
+def import_books(cursor: psycopg2.extensions.cursor, book_rows: list[tuple], author_rows: list[tuple]) -> list[int]:
+    """Inserts the books that don't exist yet along with their authors. Returns the ids of the new books.
+
+    `book_rows` are (line, title, isbn, num_pages), `author_rows` are (line, position, first_name, last_name, origin),
+    where `line` is the line of the book in the file.
     """
-    params = (OrderStatus.APPROVED, user_id)
 
-    return _get_books(cursor, sql, params)
+    cursor.execute(CREATE_BOOK_IMPORT_TABLES_SQL)
+    copy_rows(cursor, "book_import", ("line", "title", "isbn", "num_pages"), book_rows)
+    copy_rows(cursor, "book_import_author", ("line", "position", "first_name", "last_name", "origin"), author_rows)
 
+    cursor.execute(DELETE_REPEATED_IMPORT_BOOKS_SQL)
+    cursor.execute(INSERT_IMPORT_BOOKS_SQL)
+    book_ids = [record[0] for record in cursor.fetchall()]
+
+    cursor.execute(INSERT_IMPORT_AUTHORS_SQL)
+    cursor.execute(INSERT_IMPORT_BOOK_AUTHORS_SQL)
+    refresh_book_catalog(cursor, book_ids)
+
+    cursor.execute(DROP_BOOK_IMPORT_TABLES_SQL)
+
+    return book_ids
+
+
+def create_book_import_job(cursor: psycopg2.extensions.cursor, user_id: int, filename: str, path: str) -> int:
+    cursor.execute(CREATE_BOOK_IMPORT_JOB_SQL, (user_id, filename, path, BookImportStatus.PENDING))
+
+    return cursor.fetchone()[0]  # type: ignore
+
+
+def get_book_import_job(cursor: psycopg2.extensions.cursor, job_id: int) -> BookImportJob | None:
+    cursor.execute(BOOK_IMPORT_JOB_SQL, (job_id,))
+
+    if job_item := cursor.fetchone():
+        return BookImportJob(**job_item)  # type: ignore
+
+    return None
+
+
+def set_book_import_job_status(
+    cursor: psycopg2.extensions.cursor, job_id: int, status: BookImportStatus, error: str | None = None
+):
+    cursor.execute(SET_BOOK_IMPORT_JOB_STATUS_SQL, (status, error, job_id))
+
+
+def checkpoint_book_import_job(
+    cursor: psycopg2.extensions.cursor, job_id: int, byte_offset: int, lines: int, result: BookImportResult
+):
+    """Records the progress of the job. Commit it together with the chunk it was made for."""
 
-def update_book_status(cursor: psycopg2.extensions.cursor, book_id: int):
     cursor.execute(
-        """UPDATE book_order SET date_finished = %s WHERE book_id = %s AND date_finished IS NULL""",
-        (datetime.now(tz=timezone.utc), book_id),
+        CHECKPOINT_BOOK_IMPORT_JOB_SQL,
+        (byte_offset, lines, result.inserted, result.duplicates, result.rejected, job_id),
     )
 
 
-def get_books_taken_by_user(cursor: psycopg2.extensions.cursor, user_id: int) -> list[Book]:
-    sql = """
-        SELECT *
-        FROM book_order bo
-        JOIN order_ o ON bo.order_id = o.id
-        WHERE bo.date_finished IS NULL AND o.user_id = %s
-    """
+def lock_book_import_job(cursor: psycopg2.extensions.cursor, job_id: int) -> bool:
+    """Returns `False` when another connection works on the job."""
 
-    sql = f"""{BOOK_SQL}
-        JOIN book_order bo ON bo.book_id = book.id
-        JOIN order_ o ON bo.order_id = o.id
-        WHERE bo.date_finished IS NULL AND o.user_id = %s
-    """
-    params = (user_id,)
+    cursor.execute(LOCK_BOOK_IMPORT_JOB_SQL, (BOOK_IMPORT_LOCK_ID, job_id))
 
-    return _get_books(cursor, sql, params)
+    return cursor.fetchone()[0]  # type: ignore
 
-def delete_book(cursor: psycopg2.extensions.cursor, book_id: int):
-    cursor.execute("""UPDATE book SET deleted_at=NOW() WHERE id = %s""", (book_id,))
\ No newline at end of file
+
+def refresh_book_catalog(cursor: psycopg2.extensions.cursor, book_ids: list[int]):
+    """Rebuilds the `book_catalog` rows of the given books, call it after changing a book or its authors."""
+
+    cursor.execute(REFRESH_BOOK_CATALOG_SQL, (book_ids,))
\ No newline at end of file
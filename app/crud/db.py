@@ -1,14 +1,170 @@
+import csv
+import hashlib
+import io
+import itertools
+import queue
+import re
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
+from typing import IO, AsyncIterator, Callable, Iterator
 
 import psycopg2.extensions
 import psycopg2.extras
 from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
 
+from app.core.cache import schema_change_handlers
 from app.core.config import config
+from app.core.exceptions import (
+    DatabaseUnavailableException,
+    DeltaExportUnavailableException,
+    ExportBusyException,
+)
+from app.core.read_routing import is_read_only
+from app.db import create_connection, get_connection, release_connection
 
 
-def get_cursor(request: Request) -> psycopg2.extensions.cursor:
-    return request.state.conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+async def get_cursor(request: Request) -> AsyncIterator[psycopg2.extensions.cursor]:
+    """Checks a connection out only for the requests that need one.
+
+    The `db_connection` middleware commits and returns it as soon as the response is ready,
+    the teardown below only rolls back connections left behind by an exception.
+    """
+
+    conn = await run_in_threadpool(get_connection, await is_read_only(request))
+    request.state.conn = conn
+    request.state.db_used = True
+
+    try:
+        yield conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    finally:
+        if getattr(request.state, "conn", None) is conn:
+            await release_request_connection(request, commit=False)
+
+
+async def release_request_connection(request: Request, commit: bool = True):
+    if (conn := getattr(request.state, "conn", None)) is None:
+        return
+
+    del request.state.conn
+    await run_in_threadpool(release_connection, conn, commit=commit)
+
+
+async def get_streaming_cursor(request: Request) -> AsyncIterator[psycopg2.extensions.cursor]:
+    """Like `get_cursor`, but for responses streamed out of the database.
+
+    The connection stays out of `request.state`, so that the `db_connection` middleware doesn't return it
+    before the body is sent. It is rolled back and returned once the whole response is out.
+    """
+
+    conn = await run_in_threadpool(get_connection, await is_read_only(request))
+    request.state.db_used = True
+
+    try:
+        yield conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    finally:
+        await run_in_threadpool(release_connection, conn, commit=False)
+
+
+class PreparedStatements:
+    """Names of the statements prepared on a connection, least recently used first.
+
+    `generation` is the `schema_generation` they were prepared in, they are all deallocated once it changes.
+    """
+
+    def __init__(self) -> None:
+        self.generation = schema_generation
+        self.names: OrderedDict[str, None] = OrderedDict()
+
+
+# Statements prepared on each connection, they live as long as the connection does
+prepared_statements: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+# Bumped when the schema may have changed under the prepared statements, e.g. by a migration another worker ran.
+# Postgres refuses to execute a statement whose result columns changed: "cached plan must not change result type".
+schema_generation = 0
+
+
+def forget_prepared_statements():
+    global schema_generation
+
+    schema_generation += 1
+
+
+schema_change_handlers.append(forget_prepared_statements)
+
+
+@lru_cache(maxsize=256)
+def get_prepared_statement(sql: str) -> tuple[str, str]:
+    """Names a statement after its text and swaps its `%s` placeholders for `$n` ones, as PREPARE expects."""
+
+    counter = itertools.count(1)
+    statement = re.sub(r"%[s%]", lambda match: f"${next(counter)}" if match.group() == "%s" else "%", sql)
+
+    return f"stmt_{hashlib.md5(sql.encode()).hexdigest()[:16]}", statement
+
+
+def get_execute_statement(name: str, params: tuple) -> str:
+    return f"EXECUTE {name} ({', '.join(['%s'] * len(params))})" if params else f"EXECUTE {name}"
+
+
+def prepare_statement(connection, sql: str) -> tuple[str, list[str]]:
+    """Names `sql` on `connection` and lists what has to run before it can be executed there.
+
+    That is PREPARE on its first use, after DEALLOCATE of the least recently used statements past
+    `PREPARED_STATEMENTS_MAX` and DEALLOCATE ALL when the statements of the connection are from an older schema.
+    Both `execute_prepared`s run them, and call `discard_prepared_statements` when that fails.
+    """
+
+    name, statement = get_prepared_statement(sql)
+    setup = []
+
+    prepared = prepared_statements.get(connection)
+    if prepared is None or prepared.generation != schema_generation:
+        if prepared is not None:
+            setup.append("DEALLOCATE ALL")
+        prepared = prepared_statements[connection] = PreparedStatements()
+
+    if name in prepared.names:
+        prepared.names.move_to_end(name)
+        return name, setup
+
+    while len(prepared.names) >= config.PREPARED_STATEMENTS_MAX:
+        evicted, _ = prepared.names.popitem(last=False)
+        setup.append(f"DEALLOCATE {evicted}")
+
+    setup.append(f"PREPARE {name} AS {statement}")
+    prepared.names[name] = None
+
+    return name, setup
+
+
+def discard_prepared_statements(connection):
+    """The connection starts over with DEALLOCATE ALL, its statements may not be what was recorded after an error."""
+
+    if (prepared := prepared_statements.get(connection)) is not None:
+        prepared.generation = -1
+
+
+def execute_prepared(cursor: psycopg2.extensions.cursor, sql: str, params: tuple = tuple()):
+    """Runs `sql` as a server-side prepared statement, preparing it on the first use on a connection."""
+
+    name, setup = prepare_statement(cursor.connection, sql)
+
+    try:
+        for statement in setup:
+            cursor.execute(statement)
+
+        cursor.execute(get_execute_statement(name, params), params)
+    except psycopg2.Error:
+        discard_prepared_statements(cursor.connection)  # also when the statement was prepared for an older schema
+        raise
 
 
 def get_table_names(cursor: psycopg2.extensions.cursor) -> list[str]:
@@ -23,13 +179,263 @@ def get_table_names(cursor: psycopg2.extensions.cursor) -> list[str]:
     return tables
 
 
-def export_table_to_csv(cursor: psycopg2.extensions.cursor, table_name: str) -> str:
-    sql = f"""COPY (SELECT * FROM {table_name}) TO STDOUT WITH CSV HEADER DELIMITER ';'"""
-    current_datetime = datetime.now().isoformat(sep="T", timespec="seconds")
+def copy_rows(cursor: psycopg2.extensions.cursor, table_name: str, columns: tuple[str, ...], rows: list[tuple]):
+    """Loads the rows with a single COPY instead of an INSERT per row."""
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    cursor.copy_expert(f"""COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)""", buffer)
+
+
+class CopyPipe:
+    """Bounded in-memory pipe between `copy_expert`, writing in a thread of its own, and the response reading it.
+
+    COPY waits while `max_chunks` chunks are buffered, so it goes no faster than the client downloads.
+    """
+
+    def __init__(self, max_chunks: int, write_timeout: float) -> None:
+        self.write_timeout = write_timeout
+        self._chunks: queue.Queue = queue.Queue(max_chunks)
+        self._closed = threading.Event()
+
+    def _put(self, item, timeout: float | None = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while not self._closed.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+
+        return False
+
+    def write(self, data: bytes) -> int:
+        if not self._put(bytes(data), self.write_timeout):
+            raise OSError("Nobody reads the export anymore")  # aborts the COPY
+
+        return len(data)
+
+    def finish(self, error: BaseException | None = None):
+        """`None` marks the end of the data."""
+
+        self._put(error)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Called by the reader when it stops early, e.g. when the client goes away."""
+
+        self._closed.set()
+
+    def __iter__(self) -> Iterator[bytes]:
+        while (chunk := self._chunks.get()) is not None:
+            if isinstance(chunk, BaseException):
+                raise chunk
+
+            yield chunk
+
+
+class WriteStream:
+    """Runs `write` in a thread of its own and yields what it writes into the pipe as it comes.
+
+    `close` stops the writer and waits for it, whether the stream was read to the end, partly or not at all.
+    Close it before the connection `write` uses is returned, see `ClosingStreamingResponse`.
+    """
+
+    def __init__(self, write: Callable[[CopyPipe], None]) -> None:
+        self.pipe = CopyPipe(config.EXPORT_BUFFER_CHUNKS, config.EXPORT_WRITE_TIMEOUT.total_seconds())
+        self._chunks = iter(self.pipe)
+        self._thread = threading.Thread(target=self._run, args=(write,), name="stream-writes", daemon=True)
+        self._thread.start()
+
+    def _run(self, write: Callable[[CopyPipe], None]):
+        try:
+            write(self.pipe)
+        except BaseException as e:
+            self.pipe.finish(e)
+        else:
+            self.pipe.finish()
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        return next(self._chunks)
+
+    def close(self):
+        self.pipe.close()
+        self._thread.join()
+
+
+def stream_copy(cursor: psycopg2.extensions.cursor, sql: str) -> WriteStream:
+    """Yields the output of `COPY ... TO STDOUT` as it comes, nothing is written to disk."""
+
+    return WriteStream(lambda pipe: cursor.copy_expert(sql, pipe))
+
+
+TABLE_TO_CSV_SQL = """COPY (SELECT * FROM {table_name}) TO STDOUT WITH CSV HEADER DELIMITER ';'"""
+QUERY_TO_CSV_SQL = """COPY ({query}) TO STDOUT WITH CSV HEADER DELIMITER ';'"""
+
+# Has to be the first statement of a transaction, so that all of it sees one snapshot
+BEGIN_SNAPSHOT_SQL = """SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY"""
+EXPORT_SNAPSHOT_SQL = """SELECT pg_export_snapshot()"""
+SET_SNAPSHOT_SQL = """SET TRANSACTION SNAPSHOT %s"""
+
+
+# Tables with `updated_at` stamped on every change and a tombstone in `row_tombstone` for every deleted row
+CHANGE_TRACKED_TABLES = ("author", "book", "book_author", "order_", "book_order")
+
+# Rows of transactions that are still open have `updated_at` at or after the start of the oldest open transaction,
+# so a delta export ends right before it and the next one starts there. Without pg_read_all_stats the sessions of
+# other database users show no `xact_start`, see `begin_delta_export`.
+DELTA_WATERMARK_SQL = """
+    SELECT MIN(xact_start) FROM pg_stat_activity WHERE datname = current_database() AND xact_start IS NOT NULL
+"""
+READ_ALL_STATS_SQL = """SELECT pg_has_role('pg_read_all_stats', 'USAGE')"""
+CHANGED_ROWS_SQL = """SELECT * FROM {table_name} WHERE updated_at >= %s AND updated_at < %s ORDER BY updated_at, id"""
+TOMBSTONES_SQL = """
+    SELECT table_name, row_id, deleted_at FROM row_tombstone WHERE deleted_at >= %s AND deleted_at < %s ORDER BY id
+"""
+
+
+def stream_table_to_csv(cursor: psycopg2.extensions.cursor, table_name: str) -> WriteStream:
+    return stream_copy(cursor, TABLE_TO_CSV_SQL.format(table_name=table_name))
+
+
+# Full exports running at once, each one holds EXPORT_PARALLELISM connections of its own
+snapshot_exports = threading.BoundedSemaphore(config.EXPORT_MAX_CONCURRENT)
+
+
+class SnapshotExport:
+    """Copies all tables of `get_table_names` as CSV, consistently with each other.
+
+    `cursor` exports its snapshot and starts a new transaction for it, which has to stay open until the export
+    is closed. The tables are copied in parallel on `EXPORT_PARALLELISM` connections opened for the export,
+    outside of the pool, so that exports never take the connections requests wait for. At most
+    `EXPORT_MAX_CONCURRENT` exports run at once, the export fails before anything is sent when it can't start.
+    """
+
+    def __init__(self, cursor: psycopg2.extensions.cursor) -> None:
+        if not snapshot_exports.acquire(blocking=False):
+            raise ExportBusyException
+
+        self._closed = False
+        self._connections: list[psycopg2.extensions.connection] = []
+        self._idle: queue.SimpleQueue = queue.SimpleQueue()
+        self._executor: ThreadPoolExecutor | None = None
+
+        try:
+            cursor.connection.rollback()
+            cursor.execute(BEGIN_SNAPSHOT_SQL)
+            cursor.execute(EXPORT_SNAPSHOT_SQL)
+            self.snapshot = cursor.fetchone()[0]  # type: ignore
+            self.table_names = get_table_names(cursor)
+
+            for _ in range(min(config.EXPORT_PARALLELISM, len(self.table_names)) or 1):
+                conn = create_connection()
+                self._connections.append(conn)
+                self._idle.put(conn)
+        except psycopg2.OperationalError as e:
+            self.close()
+            raise DatabaseUnavailableException from e
+        except BaseException:
+            self.close()
+            raise
+
+        self._executor = ThreadPoolExecutor(len(self._connections), thread_name_prefix="snapshot-export")
+
+    def _copy_table(self, table_name: str) -> tuple[str, IO[bytes]]:
+        conn = self._idle.get()  # there are as many connections as threads
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute(BEGIN_SNAPSHOT_SQL)
+            cursor.execute(SET_SNAPSHOT_SQL, (self.snapshot,))
+
+            data = tempfile.SpooledTemporaryFile(max_size=config.EXPORT_SPOOL_MAX_SIZE)
+            cursor.copy_expert(TABLE_TO_CSV_SQL.format(table_name=table_name), data)
+            data.seek(0)
+
+            return table_name, data
+        finally:
+            if not conn.closed:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def copy_tables(self) -> Iterator[tuple[str, IO[bytes]]]:
+        """Yields each table as soon as it is copied, spooled in memory or to a temporary file when it is large."""
+
+        assert self._executor is not None
+        futures = [self._executor.submit(self._copy_table, table_name) for table_name in self.table_names]
+
+        for future in as_completed(futures):
+            yield future.result()
+
+    def close(self):
+        """Stops the COPYs still running and closes the connections of the export, can be called more than once."""
+
+        if self._closed:
+            return
+        self._closed = True
+
+        for conn in self._connections:
+            if not conn.closed:
+                conn.cancel()
+
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+        for conn in self._connections:
+            conn.close()
+
+        snapshot_exports.release()
+
+
+def _copy_query_to_csv(cursor: psycopg2.extensions.cursor, query: str, params: tuple) -> IO[bytes]:
+    data = tempfile.SpooledTemporaryFile(max_size=config.EXPORT_SPOOL_MAX_SIZE)
+    cursor.copy_expert(QUERY_TO_CSV_SQL.format(query=cursor.mogrify(query, params).decode()), data)
+    data.seek(0)
+
+    return data
+
+
+def begin_delta_export(cursor: psycopg2.extensions.cursor) -> datetime:
+    """Starts the snapshot `copy_delta` reads from, in a new transaction. Returns the watermark of the export.
+
+    The watermark is read in a transaction of its own before the snapshot is taken. A transaction that commits
+    in between was still open when the watermark was read, so its rows are left to the next export instead of
+    being missed by both.
+    """
+
+    cursor.connection.rollback()
+    cursor.execute(READ_ALL_STATS_SQL)
+    if not cursor.fetchone()[0]:  # type: ignore
+        raise DeltaExportUnavailableException
+
+    cursor.execute(DELTA_WATERMARK_SQL)
+    watermark = cursor.fetchone()[0]  # type: ignore
+    cursor.connection.rollback()
+
+    cursor.execute(BEGIN_SNAPSHOT_SQL)  # the snapshot is taken by the first query of copy_delta
+
+    return watermark
+
+
+def copy_delta(
+    cursor: psycopg2.extensions.cursor, since: datetime | None, watermark: datetime
+) -> Iterator[tuple[str, IO[bytes]]]:
+    """Copies the rows of `CHANGE_TRACKED_TABLES` changed between `since` and `watermark` as CSV,
+    then the tombstones of the rows deleted meanwhile as `row_tombstone`. Call `begin_delta_export` first.
+    """
+
+    params = (since or "-infinity", watermark)
 
-    fname = f"{config.TABLE_DATA_FOLDER}/{table_name}-{current_datetime}.csv"
-    with open(fname, "w") as file:
-        file.write
-        cursor.copy_expert(sql, file)
+    for table_name in CHANGE_TRACKED_TABLES:
+        yield table_name, _copy_query_to_csv(cursor, CHANGED_ROWS_SQL.format(table_name=table_name), params)
 
-    return fname
+    yield "row_tombstone", _copy_query_to_csv(cursor, TOMBSTONES_SQL, params)
@@ -8,6 +8,12 @@ USER_SQL = """
     SELECT id, email, first_name, last_name, role FROM user_
 """
 
+INSERT_USER_SQL = """
+    INSERT INTO user_ (email, first_name, last_name, password, role) VALUES (%s, %s, %s, %s, %s) RETURNING id
+"""
+
+DELETE_USER_SQL = """UPDATE user_ SET deleted_at=NOW() WHERE id = %s"""
+
 
 def get_user_object(user_item: tuple) -> UserResponseModelExtended:
     user_data = {key: user_item[i] for i, key in enumerate(UserResponseModelExtended.__fields__.keys())}
@@ -49,7 +55,7 @@ def get_users(cursor: psycopg2.extensions.cursor) -> list[UserResponseModelExten
 
 def insert_user(cursor: psycopg2.extensions.cursor, user: UserCreateModel, role: int = UserRole.READER):
     cursor.execute(
-        """INSERT INTO user_ (email, first_name, last_name, password, role) VALUES (%s, %s, %s, %s, %s) RETURNING id""",
+        INSERT_USER_SQL,
         (user.email, user.first_name, user.last_name, Hasher.get_password_hash(user.password), role),
     )
 
@@ -60,4 +66,4 @@ def insert_user(cursor: psycopg2.extensions.cursor, user: UserCreateModel, role:
 
 
 def delete_user(cursor: psycopg2.extensions.cursor, user_id: int):
-    cursor.execute("""UPDATE user_ SET deleted_at=NOW() WHERE id = %s""", (user_id,))
+    cursor.execute(DELETE_USER_SQL, (user_id,))
@@ -1,12 +1,425 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+
+import aiopg
 import psycopg2
+import psycopg2.extensions
 
 from app.core.config import config
+from app.core.exceptions import DatabaseUnavailableException
 
 
-def create_connection():
-    return psycopg2.connect(config.DATABASE_URL)
+def create_connection(dsn: str = config.DATABASE_URL):
+    return psycopg2.connect(dsn)
 
 
 def close_connection(conn):
     conn.commit()
     conn.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Keeps up to `max_size` connections open. When all of them are checked out, `getconn` waits
+    for one to be returned for at most `timeout` seconds instead of opening a new connection.
+    """
+
+    def __init__(self, dsn: str, min_size: int, max_size: int, timeout: float, healthcheck_interval: float) -> None:
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+
+        self._idle: deque[tuple[psycopg2.extensions.connection, float]] = deque()
+        self._in_use: set[psycopg2.extensions.connection] = set()
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def open(self) -> None:
+        connections = [self.getconn() for _ in range(self.min_size)]
+        for conn in connections:
+            self.putconn(conn)
+
+    def close(self) -> None:
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+                self._size -= 1
+
+    def __contains__(self, conn: psycopg2.extensions.connection) -> bool:
+        return conn in self._in_use
+
+    def getconn(self, timeout: float | None = None) -> psycopg2.extensions.connection:
+        """`timeout` overrides the one of the pool."""
+
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        while True:
+            conn, returned_at = self._checkout(deadline)
+
+            if conn is None:
+                conn = self._connect()
+            elif not self._is_healthy(conn, returned_at):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._in_use.add(conn)
+
+            return conn
+
+    def putconn(self, conn: psycopg2.extensions.connection, commit: bool = True) -> None:
+        with self._cond:
+            if conn not in self._in_use:  # already returned
+                return
+            self._in_use.remove(conn)
+
+        try:
+            if commit:
+                conn.commit()
+            else:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            raise
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _checkout(self, deadline: float) -> tuple[psycopg2.extensions.connection | None, float]:
+        """Takes an idle connection or reserves a slot for a new one, waiting while the pool is saturated."""
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, time.monotonic()
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DatabaseUnavailableException
+
+                self._cond.wait(remaining)
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        try:
+            return create_connection(self.dsn)
+        except psycopg2.Error:
+            self._release_slot()
+            raise
+
+    def _is_healthy(self, conn: psycopg2.extensions.connection, returned_at: float) -> bool:
+        if conn.closed:
+            return False
+
+        if time.monotonic() - returned_at < self.healthcheck_interval:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+
+        return True
+
+    def _discard(self, conn: psycopg2.extensions.connection) -> None:
+        try:
+            conn.close()
+        finally:
+            self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+
+class AsyncConnectionPool:
+    """Asyncio counterpart of `ConnectionPool` on top of aiopg.
+
+    aiopg connections are always in autocommit mode, so every statement is committed on its own.
+    """
+
+    def __init__(self, dsn: str, min_size: int, max_size: int, timeout: float, healthcheck_interval: float) -> None:
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+
+        self._pool: aiopg.Pool | None = None
+        self._returned_at: dict[aiopg.Connection, float] = {}
+        self._in_use: set[aiopg.Connection] = set()
+
+    async def open(self) -> None:
+        self._pool = await aiopg.create_pool(
+            self.dsn, minsize=self.min_size, maxsize=self.max_size, enable_hstore=False
+        )
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+
+    def __contains__(self, conn: aiopg.Connection) -> bool:
+        return conn in self._in_use
+
+    async def getconn(self, timeout: float | None = None) -> aiopg.Connection:
+        """`timeout` overrides the one of the pool."""
+
+        if self._pool is None:
+            await self.open()
+        assert self._pool is not None
+
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        while True:
+            try:
+                conn = await asyncio.wait_for(self._pool.acquire(), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                raise DatabaseUnavailableException
+
+            if await self._is_healthy(conn, self._returned_at.pop(conn, None)):
+                self._in_use.add(conn)
+                return conn
+
+            conn.close()
+            await self._pool.release(conn)
+
+    async def putconn(self, conn: aiopg.Connection) -> None:
+        assert self._pool is not None, "Pool is not opened"
+
+        if conn not in self._in_use:  # already returned
+            return
+        self._in_use.remove(conn)
+
+        self._returned_at[conn] = time.monotonic()
+        await self._pool.release(conn)
+
+    async def _is_healthy(self, conn: aiopg.Connection, returned_at: float | None) -> bool:
+        if conn.closed:
+            return False
+
+        if returned_at is None or time.monotonic() - returned_at < self.healthcheck_interval:
+            return True
+
+        try:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT 1")
+        except psycopg2.Error:
+            return False
+
+        return True
+
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class Replica:
+    def __init__(self, dsn: str) -> None:
+        self.pool = ConnectionPool(
+            dsn,
+            min_size=config.DB_POOL_MIN_SIZE,
+            max_size=config.DB_POOL_MAX_SIZE,
+            timeout=config.DB_POOL_TIMEOUT.total_seconds(),
+            healthcheck_interval=config.DB_POOL_HEALTHCHECK_INTERVAL.total_seconds(),
+        )
+        self.async_pool = AsyncConnectionPool(
+            dsn,
+            min_size=config.DB_POOL_MIN_SIZE,
+            max_size=config.DB_POOL_MAX_SIZE,
+            timeout=config.DB_POOL_TIMEOUT.total_seconds(),
+            healthcheck_interval=config.DB_POOL_HEALTHCHECK_INTERVAL.total_seconds(),
+        )
+
+        self.lagging = False
+        self.lag_checked_at = float("-inf")
+
+
+class ReplicaSet:
+    """Round-robins read-only connections over the replicas that are not too far behind the primary.
+
+    Replication lag is re-checked on a checked out connection at most once per `lag_check_interval`.
+    A replica whose pool is saturated is skipped after `checkout_timeout` without being marked as lagging,
+    the next one or the primary serves the read instead.
+    """
+
+    def __init__(self, dsns: list[str], max_lag: float, lag_check_interval: float, checkout_timeout: float) -> None:
+        self.replicas = [Replica(dsn) for dsn in dsns]
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._counter = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def in_order(self) -> list[Replica]:
+        start = next(self._counter) % len(self.replicas)
+
+        return self.replicas[start:] + self.replicas[:start]
+
+    def lag_check_due(self, replica: Replica) -> bool:
+        return time.monotonic() - replica.lag_checked_at >= self.lag_check_interval
+
+    def record_lag(self, replica: Replica, lag: float | None) -> None:
+        """`None` means the lag could not be measured, e.g. the replica is down."""
+
+        replica.lagging = lag is None or lag > self.max_lag
+        replica.lag_checked_at = time.monotonic()
+
+    def getconn(self) -> psycopg2.extensions.connection | None:
+        for replica in self.in_order():
+            if replica.lagging and not self.lag_check_due(replica):
+                continue
+
+            try:
+                conn = replica.pool.getconn(self.checkout_timeout)
+            except DatabaseUnavailableException:  # busy, not behind
+                continue
+            except psycopg2.Error:
+                self.record_lag(replica, None)
+                continue
+
+            if self.lag_check_due(replica):
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute(REPLICA_LAG_SQL)
+                        self.record_lag(replica, cursor.fetchone()[0])  # type: ignore
+                    conn.rollback()
+                except psycopg2.Error:
+                    self.record_lag(replica, None)
+
+            if not replica.lagging:
+                return conn
+
+            replica.pool.putconn(conn, commit=False)
+
+        return None
+
+    async def getconn_async(self) -> aiopg.Connection | None:
+        for replica in self.in_order():
+            if replica.lagging and not self.lag_check_due(replica):
+                continue
+
+            try:
+                conn = await replica.async_pool.getconn(self.checkout_timeout)
+            except DatabaseUnavailableException:  # busy, not behind
+                continue
+            except psycopg2.Error:
+                self.record_lag(replica, None)
+                continue
+
+            if self.lag_check_due(replica):
+                try:
+                    async with conn.cursor() as cursor:
+                        await cursor.execute(REPLICA_LAG_SQL)
+                        self.record_lag(replica, (await cursor.fetchone())[0])
+                except psycopg2.Error:
+                    self.record_lag(replica, None)
+
+            if not replica.lagging:
+                return conn
+
+            await replica.async_pool.putconn(conn)
+
+        return None
+
+
+pool = ConnectionPool(
+    config.DATABASE_URL,
+    min_size=config.DB_POOL_MIN_SIZE,
+    max_size=config.DB_POOL_MAX_SIZE,
+    timeout=config.DB_POOL_TIMEOUT.total_seconds(),
+    healthcheck_interval=config.DB_POOL_HEALTHCHECK_INTERVAL.total_seconds(),
+)
+
+
+async_pool = AsyncConnectionPool(
+    config.DATABASE_URL,
+    min_size=config.DB_POOL_MIN_SIZE,
+    max_size=config.DB_POOL_MAX_SIZE,
+    timeout=config.DB_POOL_TIMEOUT.total_seconds(),
+    healthcheck_interval=config.DB_POOL_HEALTHCHECK_INTERVAL.total_seconds(),
+)
+
+replicas = ReplicaSet(
+    [str(url) for url in config.DATABASE_REPLICA_URLS],
+    max_lag=config.REPLICA_MAX_LAG.total_seconds(),
+    lag_check_interval=config.REPLICA_LAG_CHECK_INTERVAL.total_seconds(),
+    checkout_timeout=config.REPLICA_CHECKOUT_TIMEOUT.total_seconds(),
+)
+
+
+def open_pools():
+    pool.open()
+    for replica in replicas.replicas:
+        try:
+            replica.pool.open()
+        except psycopg2.Error:  # reads fall back to the primary until the replica is back
+            replicas.record_lag(replica, None)
+
+
+def close_pools():
+    pool.close()
+    for replica in replicas.replicas:
+        replica.pool.close()
+
+
+async def open_async_pools():
+    await async_pool.open()
+    for replica in replicas.replicas:
+        try:
+            await replica.async_pool.open()
+        except psycopg2.Error:
+            replicas.record_lag(replica, None)
+
+
+async def close_async_pools():
+    await async_pool.close()
+    for replica in replicas.replicas:
+        await replica.async_pool.close()
+
+
+def get_connection(readonly: bool = False) -> psycopg2.extensions.connection:
+    """Read-only connections come from a replica when one is available and up to date."""
+
+    if readonly and replicas and (conn := replicas.getconn()) is not None:
+        return conn
+
+    return pool.getconn()
+
+
+def release_connection(conn, commit: bool = True):
+    owner = next((replica.pool for replica in replicas.replicas if conn in replica.pool), pool)
+    owner.putconn(conn, commit=commit)
+
+
+async def get_async_connection(readonly: bool = False) -> aiopg.Connection:
+    if readonly and replicas and (conn := await replicas.getconn_async()) is not None:
+        return conn
+
+    return await async_pool.getconn()
+
+
+async def release_async_connection(conn: aiopg.Connection):
+    owner = next((replica.async_pool for replica in replicas.replicas if conn in replica.async_pool), async_pool)
+    await owner.putconn(conn)
@@ -4,7 +4,12 @@ from fastapi import FastAPI, status
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.db import close_connection, create_connection
+from app.core.cache import start_cache_invalidation, stop_cache_invalidation
+from app.core.read_routing import remember_write
+from app.core.responses import FastJSONResponse
+from app.crud.db import release_request_connection
+from app.db import close_async_pools, close_pools, open_async_pools, open_pools
+from app.migrations import migrate_on_startup
 from app.routers import (
     analytics_router,
     auth_router,
@@ -25,37 +30,18 @@ async def exception_handler(request, call_next):
         return await call_next(request)
     except Exception as exc:
         print(traceback.format_exception(exc))
-        if hasattr(request.state, "conn"):
-            close_connection(request.state.conn)
+        await release_request_connection(request, commit=False)
         return JSONResponse({"err": str(exc)}, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 async def db_connection(request, call_next):
-    request.state.conn = create_connection()
-
-    if request.method != "GET":  # need to sync
-        cursor = request.state.conn.cursor()
-        cursor.execute(
-            """
-                SELECT setval('order__id_seq', (SELECT MAX(id) FROM order_))
-                UNION
-                SELECT setval('book_id_seq', (SELECT MAX(id) FROM book))
-                UNION
-                SELECT setval('offender_id_seq', (SELECT MAX(id) FROM offender))
-                UNION
-                SELECT setval('author_id_seq', (SELECT MAX(id) FROM author))
-                UNION
-                SELECT setval('book_author_id_seq', (SELECT MAX(id) FROM book_author))
-                UNION
-                SELECT setval('book_order_id_seq', (SELECT MAX(id) FROM book_order))
-                UNION
-                SELECT setval('user__id_seq', (SELECT MAX(id) FROM user_))
-            """
-        )
+    """Commits the connection checked out by `get_cursor`, if any, before the response goes out."""
 
     resp = await call_next(request)
 
-    close_connection(request.state.conn)
+    await release_request_connection(request)
+    if getattr(request.state, "db_used", False):
+        await remember_write(request)
 
     return resp
 
@@ -76,8 +62,17 @@ def create_app() -> FastAPI:
         version="0.1.0",
         docs_url="/docs",
         redoc_url=None,
-        debug=True
+        debug=True,
+        default_response_class=FastJSONResponse,
     )
+    app.add_event_handler("startup", migrate_on_startup)
+    app.add_event_handler("startup", open_pools)
+    app.add_event_handler("startup", open_async_pools)
+    app.add_event_handler("startup", start_cache_invalidation)
+    app.add_event_handler("shutdown", close_pools)
+    app.add_event_handler("shutdown", close_async_pools)
+    app.add_event_handler("shutdown", stop_cache_invalidation)
+
     app.middleware("http")(db_connection)
     app.middleware("http")(exception_handler)
     app.add_middleware(
@@ -86,6 +81,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Watermark", "Warning"],
     )
 
     init_routers(application=app)
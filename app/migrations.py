@@ -0,0 +1,106 @@
+import logging
+from pathlib import Path
+
+import psycopg2.extensions
+
+from app.core.cache import CATALOG_CHANNEL, SCHEMA_CHANGED
+from app.core.config import config
+from app.db import close_connection, create_connection
+
+LOGGER = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+# Serializes migrations between workers that start at the same time
+MIGRATIONS_LOCK_ID = 0x6C6962  # "lib"
+
+
+def get_migrations() -> list[tuple[int, str, Path]]:
+    """Migration files are named `<version>_<name>.sql` and applied in version order."""
+
+    migrations = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        version, name = path.stem.split("_", maxsplit=1)
+        migrations.append((int(version), name, path))
+
+    return sorted(migrations)
+
+
+def get_applied_versions(cursor: psycopg2.extensions.cursor) -> set[int]:
+    cursor.execute(
+        """
+            CREATE TABLE IF NOT EXISTS schema_migration (
+              version INT PRIMARY KEY,
+              name VARCHAR(200) NOT NULL,
+              applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+        """
+    )
+    cursor.execute("""SELECT version FROM schema_migration""")
+
+    return {record[0] for record in cursor.fetchall()}
+
+
+def apply_migrations(conn: psycopg2.extensions.connection) -> list[str]:
+    cursor = conn.cursor()
+    applied_versions = get_applied_versions(cursor)
+    conn.commit()
+
+    applied = []
+    for version, name, path in get_migrations():
+        if version in applied_versions:
+            continue
+
+        LOGGER.info(f"Applying migration {path.name}")
+        cursor.execute(path.read_text())
+        cursor.execute("""INSERT INTO schema_migration (version, name) VALUES (%s, %s)""", (version, name))
+        cursor.execute("""SELECT pg_notify(%s, %s)""", (CATALOG_CHANNEL, SCHEMA_CHANGED))  # for running workers
+        conn.commit()
+
+        applied.append(path.name)
+
+    return applied
+
+
+def find_sequence_drift(cursor: psycopg2.extensions.cursor) -> list[tuple[str, int, int]]:
+    cursor.execute("""SELECT sequence_name, next_value, max_id FROM sequence_drift()""")
+
+    return cursor.fetchall()
+
+
+def reconcile_sequences(cursor: psycopg2.extensions.cursor):
+    cursor.execute("""SELECT setval(sequence_name, max_id) FROM sequence_drift()""")
+
+
+def check_sequences(cursor: psycopg2.extensions.cursor):
+    """Sequences can still fall behind when rows are inserted with explicit ids outside the app."""
+
+    for sequence_name, next_value, max_id in find_sequence_drift(cursor):
+        LOGGER.warning(f"Sequence {sequence_name} would return {next_value} while MAX(id) is {max_id}. Fixing.")
+
+    reconcile_sequences(cursor)
+
+
+def migrate():
+    conn = create_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""SELECT pg_advisory_lock(%s)""", (MIGRATIONS_LOCK_ID,))
+    try:
+        apply_migrations(conn)
+        check_sequences(cursor)
+        conn.commit()
+    finally:
+        conn.rollback()
+        cursor.execute("""SELECT pg_advisory_unlock(%s)""", (MIGRATIONS_LOCK_ID,))
+        close_connection(conn)
+
+
+def migrate_on_startup():
+    if config.MIGRATE_ON_STARTUP:
+        migrate()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    migrate()
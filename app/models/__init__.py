@@ -1,4 +1,24 @@
-from .book import Author, Book, BookShort, BookAuthor, BookFilters, PageNumRange, BookUpdate
+from .analytics import ReportJob, ReportStatus
+from .book import (
+    Author,
+    AuthorFacet,
+    AvailabilityFacet,
+    Book,
+    BookAuthor,
+    BookFacets,
+    BookFilters,
+    BookImportJob,
+    BookImportResult,
+    BookImportStatus,
+    BookListJSON,
+    BookPage,
+    BookShort,
+    BookSort,
+    BookUpdate,
+    PageNumBucket,
+    PageNumRange,
+)
+from .export import ExportCompression
 from .order import OrderDetailResponseModel, OrderResponseModel, OrderResponseNewModel, OrderStatus
 from .token import TokenObtainPair, TokenUpdateModel
 from .user import (
@@ -11,14 +31,29 @@ from .user import (
 )
 
 __all__ = [
+    # analytics
+    "ReportJob",
+    "ReportStatus",
     # book
     "Author",
+    "AuthorFacet",
+    "AvailabilityFacet",
     "Book",
     "BookShort",
     "BookAuthor",
     "BookFilters",
+    "BookImportJob",
+    "BookImportResult",
+    "BookImportStatus",
+    "BookListJSON",
     "PageNumRange",
     "BookUpdate",
+    "BookPage",
+    "BookFacets",
+    "PageNumBucket",
+    "BookSort",
+    # export
+    "ExportCompression",
     # order
     "OrderDetailResponseModel",
     "OrderResponseModel",
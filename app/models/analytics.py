@@ -0,0 +1,23 @@
+from datetime import datetime
+from enum import IntEnum, auto
+
+from pydantic import BaseModel, Field
+
+
+class ReportStatus(IntEnum):
+    PENDING = auto()  # 1
+    RUNNING = auto()
+    FAILED = auto()
+    DONE = auto()
+
+
+class ReportJob(BaseModel):
+    id: int
+    status: ReportStatus
+    error: str | None
+    created_at: datetime
+    updated_at: datetime
+    artifact: str | None = Field(default=None, exclude=True)  # name of the document in the artifact store
+
+    class Config:
+        json_encoders = {ReportStatus: lambda report_status: report_status.name}
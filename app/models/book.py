@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from datetime import datetime
+from enum import Enum, IntEnum, auto
+
+from pydantic import BaseModel, Field
 
 
 class Author(BaseModel):
@@ -22,6 +25,7 @@ class Book(BaseModel):
     image_url: str
     authors: list[Author]
     description: str
+    relevance: float | None = Field(default=None, exclude=True)  # rank of the book in search results
 
 class BookUpdate(BaseModel):
     title: str
@@ -43,6 +47,75 @@ class PageNumRange(BaseModel):
     min: int
     max: int
 
+class AuthorFacet(BaseModel):
+    id: int
+    count: int
+
+class PageNumBucket(BaseModel):
+    min: int
+    max: int | None  # exclusive, `None` for the last bucket
+    count: int
+
+class AvailabilityFacet(BaseModel):
+    available: int
+    unavailable: int
+
+class BookFacets(BaseModel):
+    """Number of books matching the current search and filters, in total and per author, page range and availability."""
+
+    total: int
+    author_counts: list[AuthorFacet]
+    page_buckets: list[PageNumBucket]
+    availability: AvailabilityFacet
+
 class BookFilters(BaseModel):
     authors: list[Author]
     num_pages: PageNumRange
+    facets: BookFacets | None = None
+
+class BookSort(str, Enum):
+    TITLE = "title"
+    NUM_PAGES = "num_pages"
+    ID = "id"
+    RELEVANCE = "relevance"
+
+class BookPage(BaseModel):
+    sort: BookSort = BookSort.TITLE
+    desc: bool = False
+    after: list | None = None  # sort key of the last book of the previous page
+    limit: int | None = None
+
+class BookImportResult(BaseModel):
+    inserted: int
+    duplicates: int  # already in the catalog or repeated in the file
+    rejected: int  # malformed lines
+
+class BookImportStatus(IntEnum):
+    PENDING = auto()  # 1
+    RUNNING = auto()
+    FAILED = auto()
+    DONE = auto()
+
+class BookImportJob(BaseModel):
+    id: int
+    filename: str
+    status: BookImportStatus
+    lines_processed: int
+    inserted: int
+    duplicates: int
+    rejected: int
+    error: str | None
+    created_at: datetime
+    updated_at: datetime
+    path: str = Field(default="", exclude=True)  # the uploaded file
+    byte_offset: int = Field(default=0, exclude=True)  # where the next chunk of the file starts
+
+    class Config:
+        json_encoders = {BookImportStatus: lambda import_status: import_status.name}
+
+class BookListJSON(BaseModel):
+    """A list of books serialized by Postgres, sent to clients as is."""
+
+    content: str
+    count: int
+    last_sort_key: list | None  # sort key of the last book, for the cursor of the next page
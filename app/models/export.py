@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class ExportCompression(str, Enum):
+    GZIP = "gzip"
+    ZSTD = "zstd"
@@ -1,32 +1,109 @@
-import uuid
 from datetime import datetime
+from pathlib import Path
 
-import psycopg2.extensions
-from fastapi import APIRouter, Depends, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse
 
+from app.core.artifacts import artifact_store
 from app.core.config import config
-from app.crud.db import get_cursor
-from app.services import generate_report
+from app.crud.aio import get_report_version, primary_async_cursor, start_report_job
+from app.models import ReportJob, ReportStatus
+from app.services import get_report_job_or_404, get_report_path, wait_for_report_job
+from app.tasks import generate_report_file
 
 analytics_router = APIRouter(tags=["analytics"])
 
+REPORT_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+async def start_report() -> ReportJob:
+    """Joins the report job in progress, starts a new one when there is none."""
+
+    async with primary_async_cursor() as cursor:
+        job, created = await start_report_job(cursor, config.REPORT_JOB_TIMEOUT)
+
+    if created:
+        generate_report_file.delay(job.id)  # type: ignore
+
+    return job
+
+
+def report_file_response(report_path: Path, stale: bool = False) -> FileResponse:
+    current_datetime = datetime.now().isoformat(sep="T", timespec="seconds")
+
+    return FileResponse(
+        report_path,
+        media_type=REPORT_MEDIA_TYPE,
+        filename=f"report-{current_datetime}.docx",
+        headers={"Warning": '110 - "Response is Stale"'} if stale else None,
+    )
+
 
 @analytics_router.get(
     "/report",
     summary="Returns .docx report in base64 encoded format.",
     status_code=status.HTTP_200_OK,
 )
-async def get_analytics(cursor: psycopg2.extensions.cursor = Depends(get_cursor)):
-    current_datetime = datetime.now().isoformat(sep="T", timespec="seconds")
-    save_path = f"{config.TABLE_DATA_FOLDER}/report-{uuid.uuid4()}-{current_datetime}.docx"
+async def get_analytics():
+    """
+    The report is generated again only when its data changed since the last one. Until the new report is ready,
+    the previous one is sent with a `Warning: 110` header.
 
-    generate_report(cursor, save_path)
+    Without a previous report, waits for the new one for a while. If it is still being generated by then,
+    responds with 202 and the job, poll `GET /analytics/report/jobs/{job_id}` for it.
+    """
 
-    return StreamingResponse(
-        open(save_path, "rb"),
-        headers={
-            "Content-Disposition": f'attachment; filename="{save_path}"',
-            "Content-Type": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        },
-    )
+    async with primary_async_cursor() as cursor:
+        version = await get_report_version(cursor)
+
+    if (report_path := artifact_store.get("report", version)) is not None:
+        return report_file_response(report_path)
+
+    job = await start_report()
+
+    if (report_path := artifact_store.latest("report")) is not None:
+        # the job may have finished already, e.g. when it only had to pick up a report stored for this version
+        return report_file_response(report_path, stale=report_path != artifact_store.get("report", version))
+
+    job = await wait_for_report_job(job, config.REPORT_WAIT_TIMEOUT)
+
+    if job.status not in (ReportStatus.FAILED, ReportStatus.DONE):
+        return JSONResponse(
+            jsonable_encoder(job),
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={"Location": f"/analytics/report/jobs/{job.id}"},
+        )
+
+    return report_file_response(get_report_path(job))
+
+
+@analytics_router.post(
+    "/report/jobs",
+    summary="Start generating the report, or join the generation in progress.",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def create_report_job() -> ReportJob:
+    return await start_report()
+
+
+@analytics_router.get(
+    "/report/jobs/{job_id}",
+    summary="Get status of a report job.",
+    status_code=status.HTTP_200_OK,
+)
+async def retrieve_report_job(job_id: int) -> ReportJob:
+    async with primary_async_cursor() as cursor:
+        return await get_report_job_or_404(cursor, job_id)
+
+
+@analytics_router.get(
+    "/report/jobs/{job_id}/download",
+    summary="Download the .docx report of a finished job.",
+    status_code=status.HTTP_200_OK,
+)
+async def download_report(job_id: int):
+    async with primary_async_cursor() as cursor:
+        job = await get_report_job_or_404(cursor, job_id)
+
+    return report_file_response(get_report_path(job))
@@ -1,33 +1,67 @@
-import csv
+from datetime import datetime
 
+import aiopg
 import psycopg2.extensions
-from fastapi import APIRouter, Depends, File, UploadFile, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, File, Query, Response, UploadFile, status
 
-from app.core.exceptions import NotFoundException, UploadBooksException
+from app.core.etag import check_catalog_etag
+from app.core.exceptions import BookImportFinishedException, NotFoundException, UploadBooksException
 from app.core.jwt import get_current_user
+from app.core.responses import ClosingStreamingResponse, RawJSONResponse
 from app.crud import (
-    export_table_to_csv,
-    filter_books,
-    get_all_books,
-    get_available_books,
-    get_book_filters,
+    SnapshotExport,
+    begin_delta_export,
     get_cursor,
-    get_unavailable_books,
-    get_user_book_list,
-    get_books_by_title,
+    get_streaming_cursor,
+    stream_all_books,
+    stream_filtered_books,
+    stream_table_to_csv,
     update_book_status,
+)
+from app.crud.aio import (
+    count_all_books,
+    count_books_by_title,
+    count_filtered_books,
+    delete_book,
+    filter_books_json,
+    get_all_books_json,
+    get_async_cursor,
     get_authors,
-    delete_book
+    get_book_facets,
+    get_book_filters,
+    get_books_from_ids_json,
+    get_one_book,
+    get_user_book_list_json,
+)
+from app.models import (
+    Author,
+    Book,
+    BookFilters,
+    BookImportJob,
+    BookImportStatus,
+    BookSort,
+    BookUpdate,
+    ExportCompression,
+    UserResponseModelExtended,
 )
-from app.models import Book, BookFilters, UserResponseModelExtended, Author, BookUpdate
 from app.services import (
+    EXPORT_FILE_SUFFIXES,
+    EXPORT_MEDIA_TYPES,
+    compress_chunks,
+    encode_book_cursor,
+    get_book_import_job_or_404,
     get_book_or_404,
-    insert_books,
-    validate_data_folder_existence,
+    get_book_page,
+    get_search_parameters,
+    spool_book_import,
+    stream_database_zip,
+    stream_delta_zip,
     validate_table_existence,
-    update_single_book
+    update_single_book,
+    validate_book_ids,
+    validate_compression,
 )
+from app.tasks import import_books_file
 from app.tasks.celery import celery
 
 book_router = APIRouter(tags=["books"])
@@ -38,78 +72,160 @@ book_router = APIRouter(tags=["books"])
     summary="Retrieve books.",
     status_code=status.HTTP_200_OK,
     response_model=list[Book],
+    dependencies=[Depends(check_catalog_etag)],
 )
 async def retrieve_books(
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    response: Response,
+    cursor: aiopg.Cursor = Depends(get_async_cursor),
     search_term: str | None = None,
     availability: bool | None = None, 
     authors: str | None = None, 
     min: int | None = None, 
-    max: int | None = None
-) -> list[Book]:
-    
-    search_parameters = {}
-
-    if availability != None:
-        search_parameters["availability"] = availability
-    if authors:
-        search_parameters["authors"] = authors
-    if min and max:
-        search_parameters["min"] = min
-        search_parameters["max"] = max
+    max: int | None = None,
+    sort: BookSort | None = None,
+    desc: bool | None = None,
+    limit: int | None = Query(default=None, ge=1, le=100),
+    after: str | None = None,
+    with_total: bool = True,
+    ids: str | None = None,
+) -> Response:
+    """
+    `ids` fetches up to 100 books by id at once, e.g. `?ids=1,2,3`, in that order. Other parameters are ignored
+    then and unknown or deleted books are left out.
+
+    `search_term` is matched against titles, authors and descriptions and can be combined with the filters.
+    Search results are sorted by relevance by default, other listings by title.
+
+    Without `limit` the whole catalog is returned. With it, the `X-Next-Cursor` response header holds
+    the value of `after` for the next page, it is missing on the last page.
+    `X-Total-Count` is the number of books on all pages, pass `with_total=false` to skip counting them.
+    """
+
+    if ids:
+        books = await get_books_from_ids_json(cursor, validate_book_ids(ids), with_deleted=False)
+        return RawJSONResponse(books.content, headers=response.headers)
+
+    search_term = search_term.strip() if search_term else None
+    page = get_book_page(sort, desc, after, limit, searching=bool(search_term))
+    search_parameters = get_search_parameters(availability, authors, min, max)
 
     print(f"Search params: {search_parameters}")
 
-    result = None
+    books = None
+    total = None
+    count_needed = with_total and (limit is not None or after is not None)
 
     if not search_parameters and search_term:
         print("Performing text search...")
-        result = get_books_by_title(cursor, search_term)
+        books = await filter_books_json(cursor, {}, page, search_term)
+        if count_needed:
+            total = await count_books_by_title(cursor, search_term)
     elif search_parameters:
         print("Performing filtering...")
-        result = filter_books(cursor, search_parameters)
+        books = await filter_books_json(cursor, search_parameters, page, search_term)
+        if count_needed:
+            total = await count_filtered_books(cursor, search_parameters, search_term)
     else:
         print("Retrieving all books...")
-        result = get_all_books(cursor)
+        books = await get_all_books_json(cursor, page)
+        if count_needed:
+            total = await count_all_books(cursor)
+
+    if limit is not None and books.last_sort_key is not None and books.count == limit:
+        response.headers["X-Next-Cursor"] = encode_book_cursor(page, books.last_sort_key)
+    if with_total:
+        response.headers["X-Total-Count"] = str(books.count if total is None else total)
+
+    # Headers set on `response` are dropped when a response object is returned
+    return RawJSONResponse(books.content, headers=response.headers)
+
+@book_router.get(
+    "/stream",
+    summary="Stream books as NDJSON.",
+    status_code=status.HTTP_200_OK,
+    response_class=ClosingStreamingResponse,
+)
+async def stream_books(
+    cursor: psycopg2.extensions.cursor = Depends(get_streaming_cursor),
+    search_term: str | None = None,
+    availability: bool | None = None,
+    authors: str | None = None,
+    min: int | None = None,
+    max: int | None = None,
+    sort: BookSort | None = None,
+    desc: bool | None = None,
+) -> ClosingStreamingResponse:
+    """
+    All books matching the search and filters, which work as in `GET /books/`, one JSON object per line.
+    Memory use doesn't depend on the number of books, so this is the way to export the whole catalog.
+    """
+
+    search_term = search_term.strip() if search_term else None
+    page = get_book_page(sort, desc, None, None, searching=bool(search_term))
+    search_parameters = get_search_parameters(availability, authors, min, max)
+
+    if search_parameters or search_term:
+        books = stream_filtered_books(cursor, search_parameters, page, search_term)
+    else:
+        books = stream_all_books(cursor, page)
+
+    return ClosingStreamingResponse(books, media_type="application/x-ndjson")
 
-    return result
 
 @book_router.get(
     "/filters",
     summary="Get book filters",
-    status_code=status.HTTP_200_OK
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(check_catalog_etag)],
 )
 async def retrieve_book_filters(
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor)
+    cursor: aiopg.Cursor = Depends(get_async_cursor),
+    search_term: str | None = None,
+    availability: bool | None = None,
+    authors: str | None = None,
+    min: int | None = None,
+    max: int | None = None,
 ) -> BookFilters:
-    return get_book_filters(cursor)
+    """`facets` count the books matching the given search and filters, which work as in `GET /books/`."""
+
+    search_parameters = get_search_parameters(availability, authors, min, max)
+    facets = await get_book_facets(cursor, search_parameters, search_term)
+
+    return (await get_book_filters(cursor)).copy(update={"facets": facets})
 
 @book_router.get(
     "/mine",
     summary="Retrieve book by id.",
     status_code=status.HTTP_200_OK,
+    response_model=list[Book],
 )
 async def retrieve_current_user_books(
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    cursor: aiopg.Cursor = Depends(get_async_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
-) -> list[Book]:
-    return get_user_book_list(cursor, user_id=user.id)
+) -> Response:
+    books = await get_user_book_list_json(cursor, user_id=user.id)
+
+    return RawJSONResponse(books.content)
 
 
 @book_router.get(
     "/{book_id}",
     summary="Retrieve book by id.",
     status_code=status.HTTP_200_OK,
+    dependencies=[Depends(check_catalog_etag)],
 )
-async def retrieve_single_book(book_id: int, cursor: psycopg2.extensions.cursor = Depends(get_cursor)) -> Book:
-    return get_book_or_404(cursor, book_id)
+async def retrieve_single_book(book_id: int, cursor: aiopg.Cursor = Depends(get_async_cursor)) -> Book:
+    if (book := await get_one_book(cursor, book_id)) is None:
+        raise NotFoundException
+
+    return book
 
 @book_router.put(
     "/{book_id}/",
     summary="Update book by id.",
     status_code=status.HTTP_200_OK,
 )
-async def update_book(
+def update_book(
     book_id: int,
     book: BookUpdate, 
     cursor: psycopg2.extensions.cursor = Depends(get_cursor)) -> Book:
@@ -121,9 +237,10 @@ async def update_book(
     "/authors/",
     summary="Retrieve all authors",
     status_code=status.HTTP_200_OK,
+    dependencies=[Depends(check_catalog_etag)],
 )
-async def retrieve_all_authors(cursor: psycopg2.extensions.cursor = Depends(get_cursor)) -> list[Author]:
-    return get_authors(cursor)
+async def retrieve_all_authors(cursor: aiopg.Cursor = Depends(get_async_cursor)) -> list[Author]:
+    return await get_authors(cursor)
 
 
 @book_router.post(
@@ -131,7 +248,7 @@ async def retrieve_all_authors(cursor: psycopg2.extensions.cursor = Depends(get_
     summary="Mark book as returned (librarian).",
     status_code=status.HTTP_200_OK,
 )
-async def mark_book_as_returned(
+def mark_book_as_returned(
     book_id: int,
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
@@ -148,13 +265,13 @@ async def mark_book_as_returned(
 @book_router.post(
     "/import",
     summary="Upload books from provided .csv-file.",
-    status_code=status.HTTP_201_CREATED,
+    status_code=status.HTTP_202_ACCEPTED,
 )
-async def import_books(
+def import_books(
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
     csv_file: UploadFile = File(),
-):
+) -> BookImportJob:
     """
     CSV structure - book_title;isbn;num_of_pages;authors
 
@@ -162,30 +279,67 @@ async def import_books(
     author1_first_name author1_second_name author1_origin, author2_first_name author2_second_name author2_origin, ...
 
     Example: Программирование на языке Rust;9785041950392;550;Джейсон Орендорф США, Джим Блэнди США
+
+    The file is imported in the background, poll `GET /books/import/{job_id}` for the progress.
+    Books already in the catalog or repeated in the file are counted as `duplicates`, malformed lines as `rejected`.
     """
 
     if not user.is_librarian and not user.is_admin:
         raise NotFoundException
 
     try:
-        decoded_file_content = list(map(bytes.decode, csv_file.file.readlines()))
-        fieldnames = ["book_title", "isbn", "num_of_pages", "authors"]
-
-        reader = csv.DictReader(decoded_file_content, fieldnames=fieldnames, delimiter=";")
-        books = list(reader)
-
-        print(books)
-
-        book_count = insert_books(cursor, books)
+        job = spool_book_import(cursor, user.id, csv_file)
     except Exception as e:
         print(type(e), ":", e)
         raise UploadBooksException
     finally:
         csv_file.file.close()
 
-    return {
-        "detail": f"Successfully inserted {book_count} book{'s' if book_count != 1 else ''} from '{csv_file.filename}'!"
-    }
+    cursor.connection.commit()  # the worker has to see the job
+    import_books_file.delay(job.id)  # type: ignore
+
+    return job
+
+
+@book_router.get(
+    "/import/{job_id}",
+    summary="Get progress of a book import.",
+    status_code=status.HTTP_200_OK,
+)
+def retrieve_book_import(
+    job_id: int,
+    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    user: UserResponseModelExtended = Depends(get_current_user),
+) -> BookImportJob:
+    if not user.is_librarian and not user.is_admin:
+        raise NotFoundException
+
+    return get_book_import_job_or_404(cursor, job_id)
+
+
+@book_router.post(
+    "/import/{job_id}/resume",
+    summary="Resume a failed book import.",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def resume_book_import(
+    job_id: int,
+    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    user: UserResponseModelExtended = Depends(get_current_user),
+) -> BookImportJob:
+    """Continues after the last imported chunk. Does nothing if the import is running already."""
+
+    if not user.is_librarian and not user.is_admin:
+        raise NotFoundException
+
+    job = get_book_import_job_or_404(cursor, job_id)
+
+    if job.status == BookImportStatus.DONE:
+        raise BookImportFinishedException
+
+    import_books_file.delay(job.id)  # type: ignore
+
+    return job
 
 
 # TODO: move it to other router
@@ -194,26 +348,92 @@ async def import_books(
     summary="Export books from DB to csv.",
     status_code=status.HTTP_201_CREATED,
 )
-async def export_books(
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+def export_books(
+    cursor: psycopg2.extensions.cursor = Depends(get_streaming_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
+    compression: ExportCompression | None = None,
 ):
+    """The CSV is streamed as COPY produces it, `compression` compresses it on the fly."""
+
     if not user.is_librarian:
         raise NotFoundException
 
     table_name = "book"
 
     validate_table_existence(cursor, table_name)
-    validate_data_folder_existence()
+    validate_compression(compression)
+
+    current_datetime = datetime.now().isoformat(sep="T", timespec="seconds")
+    filename = f"{table_name}-{current_datetime}.csv{EXPORT_FILE_SUFFIXES[compression]}"
+
+    csv_stream = stream_table_to_csv(cursor, table_name)
+
+    return ClosingStreamingResponse(
+        compress_chunks(csv_stream, compression),
+        media_type=EXPORT_MEDIA_TYPES[compression],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        closing=[csv_stream],
+    )
+
+@book_router.post(
+    "/export/all",
+    summary="Export all tables from DB to a zip archive of csv files.",
+    status_code=status.HTTP_201_CREATED,
+)
+def export_all_tables(
+    cursor: psycopg2.extensions.cursor = Depends(get_streaming_cursor),
+    user: UserResponseModelExtended = Depends(get_current_user),
+):
+    """All tables are exported from the same snapshot of the database, several of them at once."""
+
+    if not user.is_librarian:
+        raise NotFoundException
+
+    current_datetime = datetime.now().isoformat(sep="T", timespec="seconds")
+    export = SnapshotExport(cursor)
+    zip_stream = stream_database_zip(export)
+
+    return ClosingStreamingResponse(
+        zip_stream,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="library-{current_datetime}.zip"'},
+        closing=[export, zip_stream],  # the export first, so that its running COPYs stop
+    )
+
+@book_router.post(
+    "/export/delta",
+    summary="Export rows changed since the previous export to a zip archive of csv files.",
+    status_code=status.HTTP_201_CREATED,
+)
+def export_delta(
+    cursor: psycopg2.extensions.cursor = Depends(get_streaming_cursor),
+    user: UserResponseModelExtended = Depends(get_current_user),
+    since: datetime | None = None,
+):
+    """
+    Rows of authors, books, their authors, orders and their books inserted or updated since `since`,
+    and `row_tombstone.csv` with the ids of the rows deleted meanwhile. Deleted books are updates, see `deleted_at`.
+
+    Pass the `X-Watermark` response header, also in `watermark.txt`, as `since` of the next export.
+    Without `since` all rows are exported.
+    """
+
+    if not user.is_librarian:
+        raise NotFoundException
 
-    filename = export_table_to_csv(cursor, table_name)
+    watermark = begin_delta_export(cursor)
+    filename = f"library-delta-{watermark.isoformat(timespec='seconds')}.zip"
 
-    return FileResponse(filename)
+    return ClosingStreamingResponse(
+        stream_delta_zip(cursor, since, watermark),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Watermark": watermark.isoformat()},
+    )
 
 @book_router.delete(
     "/{book_id}/",
     summary="Delete book by id",
     status_code=status.HTTP_200_OK,
 )
-async def delete_book_item(book_id:int, cursor: psycopg2.extensions.cursor = Depends(get_cursor)):
-    return delete_book(cursor=cursor, book_id=book_id)
\ No newline at end of file
+async def delete_book_item(book_id:int, cursor: aiopg.Cursor = Depends(get_async_cursor)):
+    return await delete_book(cursor=cursor, book_id=book_id)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
+import aiopg
 import psycopg2.extensions
 from app.crud.book import get_books_by_order
 from fastapi import APIRouter, Depends, status
@@ -12,7 +13,8 @@ from app.core.exceptions import (
     ForbiddenException
 )
 from app.core.jwt import get_current_user
-from app.crud import get_books_taken_by_user, get_cursor
+from app.crud import get_books_taken_by_user, get_cursor, lend_order_books
+from app.crud.aio import get_async_cursor
 from app.models import (
     OrderDetailResponseModel,
     OrderResponseModel,
@@ -41,7 +43,7 @@ order_router = APIRouter(tags=["order"])
 )
 async def get_orders(
     state: str | None = None,
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    cursor: aiopg.Cursor = Depends(get_async_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ):
     status_list = generate_status_list(state) or list(OrderStatus)
@@ -63,8 +65,8 @@ async def get_orders(
 
     sql += "\nGROUP BY o.id, u.first_name, u.last_name;"
 
-    cursor.execute(sql, params)
-    orders: list = cursor.fetchall()
+    await cursor.execute(sql, params)
+    orders: list = await cursor.fetchall()
 
     print(sql)
     print(orders)
@@ -77,7 +79,7 @@ async def get_orders(
     status_code=status.HTTP_201_CREATED,
     summary="Create order for user.",
 )
-async def create_order(
+def create_order(
     books_ids: list[int],
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
@@ -121,7 +123,7 @@ async def create_order(
     summary="Get order by id.",
     response_model=OrderDetailResponseModel,
 )
-async def get_order(
+def get_order(
     order_id: int,
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
@@ -148,7 +150,7 @@ async def get_order(
     status_code=status.HTTP_200_OK,
     summary="Approve order by id. (librarian or admin)",
 )
-async def approve_order(
+def approve_order(
     order_id: int,
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
@@ -158,11 +160,16 @@ async def approve_order(
 
     order_item = validate_order_status(cursor, order_id)
 
-    user_id, requested_books = order_item["user_id"], order_item["requested_books"]  # type: ignore
-    books_ids = list(map(int, requested_books.split(",")))
+    user_id = order_item["user_id"]  # type: ignore
+    # `requested_books` also lists the books the user already has, only the ones of this order get lent
+    books_ids = [book.id for book in get_books_by_order(cursor, order_id)]
 
     validate_order_books_available(cursor, books_ids)
 
+    if not_lent_books_ids := set(books_ids) - set(lend_order_books(cursor, order_id)):
+        # lent out by another order approved in the meantime
+        validate_order_books_available(cursor, list(not_lent_books_ids))
+
     current_datetime = datetime.now(tz=timezone.utc)
 
     book_order_values = (str((order_id, book_id, current_datetime.isoformat())) for book_id in books_ids)
@@ -179,7 +186,7 @@ async def approve_order(
     status_code=status.HTTP_200_OK,
     summary="Reject order by id. (librarian)",
 )
-async def reject_order(
+def reject_order(
     order_id: int,
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
@@ -1,3 +1,4 @@
+import aiopg
 import psycopg2.extensions
 from fastapi import APIRouter, Depends, status
 
@@ -5,14 +6,7 @@ import logging
 
 from app.core.exceptions import ForbiddenException, NotFoundException
 from app.core.jwt import get_current_user
-from app.crud import (
-    delete_user,
-    get_cursor,
-    get_user,
-    get_users,
-    get_users_except_admins,
-    insert_user,
-)
+from app.crud import aio, get_cursor, get_user, get_users, get_users_except_admins
 from app.models import (
     OrderResponseModel,
     UserCreateModel,
@@ -57,13 +51,13 @@ def get_all_users(
 )
 async def create_librarian(
     user_data: UserCreateModel,
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    cursor: aiopg.Cursor = Depends(aio.get_async_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ):
     if not user.is_admin:
         raise NotFoundException
 
-    user_id = insert_user(cursor, user_data, role=UserRole.LIBRARIAN)
+    user_id = await aio.insert_user(cursor, user_data, role=UserRole.LIBRARIAN)
 
     return {"user_id": user_id}
 
@@ -125,10 +119,10 @@ def retrieve_user(
 )
 async def retrieve_user_books(
     user_id: int,
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    cursor: aiopg.Cursor = Depends(aio.get_async_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ):
-    if not user.is_librarian or (user_obj := get_user(cursor, user_id)) is None:
+    if not user.is_librarian or (user_obj := await aio.get_user(cursor, user_id)) is None:
         raise NotFoundException
 
     return await retrieve_current_user_books(cursor=cursor, user=user_obj)
@@ -139,12 +133,12 @@ async def retrieve_user_books(
     summary="Mark book as returned (librarian).",
     status_code=status.HTTP_200_OK,
 )
-async def mark_user_book_as_returned(
+def mark_user_book_as_returned(
     book_id: int,
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ) -> None:
-    return await mark_book_as_returned(book_id=book_id, cursor=cursor, user=user)
+    return mark_book_as_returned(book_id=book_id, cursor=cursor, user=user)
 
 
 @user_router.get(
@@ -156,10 +150,10 @@ async def mark_user_book_as_returned(
 async def retrieve_user_orders(
     user_id: int,
     state: str | None = None,
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    cursor: aiopg.Cursor = Depends(aio.get_async_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ):
-    if not user.is_librarian or (user_obj := get_user(cursor, user_id)) is None:
+    if not user.is_librarian or (user_obj := await aio.get_user(cursor, user_id)) is None:
         raise NotFoundException
 
     return await get_orders(state=state, cursor=cursor, user=user_obj)
@@ -170,7 +164,7 @@ async def retrieve_user_orders(
     summary="Retrieve user's order by <id>. (librarian)",
     status_code=status.HTTP_200_OK,
 )
-async def retrieve_user_order(
+def retrieve_user_order(
     user_id: int,
     order_id: int,
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
@@ -179,7 +173,7 @@ async def retrieve_user_order(
     if not user.is_librarian or (user_obj := get_user(cursor, user_id)) is None:
         raise NotFoundException
 
-    return await get_order(order_id=order_id, cursor=cursor, user=user_obj)
+    return get_order(order_id=order_id, cursor=cursor, user=user_obj)
 
 
 @user_router.post(
@@ -187,12 +181,12 @@ async def retrieve_user_order(
     status_code=status.HTTP_200_OK,
     summary="Approve order by id. (librarian)",
 )
-async def approve_user_order(
+def approve_user_order(
     order_id: int,
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ):
-    return await approve_order(order_id=order_id, cursor=cursor, user=user)
+    return approve_order(order_id=order_id, cursor=cursor, user=user)
 
 
 @user_router.post(
@@ -200,12 +194,12 @@ async def approve_user_order(
     status_code=status.HTTP_200_OK,
     summary="Reject order by id. (librarian)",
 )
-async def reject_user_order(
+def reject_user_order(
     order_id: int,
     cursor: psycopg2.extensions.cursor = Depends(get_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ):
-    return await reject_order(order_id=order_id, cursor=cursor, user=user)
+    return reject_order(order_id=order_id, cursor=cursor, user=user)
 
 @user_router.delete(
     path="/{user_id}/",
@@ -214,13 +208,13 @@ async def reject_user_order(
 )
 async def block_user(
     user_id: int,
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    cursor: aiopg.Cursor = Depends(aio.get_async_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ) -> int:
     if not user.is_admin:
         raise NotFoundException
 
-    return await delete_user(cursor=cursor, user_id=user_id)
+    return await aio.delete_user(cursor=cursor, user_id=user_id)
 
 @user_router.post(
     path="/{user_id}/",
@@ -229,10 +223,10 @@ async def block_user(
 )
 async def block_user(
     user_id: int,
-    cursor: psycopg2.extensions.cursor = Depends(get_cursor),
+    cursor: aiopg.Cursor = Depends(aio.get_async_cursor),
     user: UserResponseModelExtended = Depends(get_current_user),
 ) -> int:
     if not user.is_admin:
         raise NotFoundException
 
-    return await delete_user(cursor=cursor, user_id=user_id)
\ No newline at end of file
+    return await aio.delete_user(cursor=cursor, user_id=user_id)
\ No newline at end of file
@@ -1,7 +1,32 @@
-from .analytics import generate_report
-from .book import get_book_or_404, insert_books, update_single_book
+from .analytics import (
+    generate_report,
+    get_report_job_or_404,
+    get_report_path,
+    wait_for_report_job,
+)
+from .book import (
+    encode_book_cursor,
+    get_book_import_job_or_404,
+    get_book_or_404,
+    get_book_page,
+    get_search_parameters,
+    insert_books,
+    read_book_rows,
+    spool_book_import,
+    update_single_book,
+)
+from .export import (
+    EXPORT_FILE_SUFFIXES,
+    EXPORT_MEDIA_TYPES,
+    compress_chunks,
+    stream_database_zip,
+    stream_delta_zip,
+    validate_compression,
+)
 from .user import get_user_or_404
 from .validators import (
+    validate_author_ids,
+    validate_book_ids,
     validate_data_folder_existence,
     validate_order_books_available,
     validate_order_status,
@@ -12,10 +37,26 @@ from .validators import (
 )
 
 __all__ = [
+    "EXPORT_FILE_SUFFIXES",
+    "EXPORT_MEDIA_TYPES",
+    "compress_chunks",
+    "encode_book_cursor",
     "generate_report",
+    "get_book_page",
+    "get_search_parameters",
+    "get_book_import_job_or_404",
     "get_book_or_404",
+    "get_report_job_or_404",
+    "get_report_path",
     "insert_books",
+    "read_book_rows",
+    "spool_book_import",
+    "stream_database_zip",
+    "stream_delta_zip",
     "get_user_or_404",
+    "validate_author_ids",
+    "validate_book_ids",
+    "validate_compression",
     "validate_data_folder_existence",
     "validate_order_books_available",
     "validate_order_status",
@@ -23,5 +64,6 @@ __all__ = [
     "validate_user_book_count",
     "validate_user_is_not_exist",
     "validate_user_is_not_offender",
-    "update_single_book"
+    "update_single_book",
+    "wait_for_report_job",
 ]
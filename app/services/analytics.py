@@ -1,16 +1,30 @@
+import asyncio
+import io
+import time
 from datetime import timedelta
+from pathlib import Path
 from typing import Any
 
+import aiopg
 import matplotlib.pyplot as plt
 import numpy as np
 import psycopg2.extensions
 from docx import Document
 from docx.shared import Inches
 
+from app.core.artifacts import artifact_store
+from app.core.config import config
+from app.core.exceptions import (
+    ReportExpiredException,
+    ReportFailedException,
+    ReportNotReadyException,
+)
 from app.core.exceptions.base import NotFoundException
+from app.crud.aio import get_report_job, primary_async_cursor
+from app.models import ReportJob, ReportStatus
 
 
-def generate_report(cursor: psycopg2.extensions.cursor, save_path: str) -> None:
+def generate_report(cursor: psycopg2.extensions.cursor, save_path: str | Path) -> None:
     document = Document()
 
     document.add_heading("Library Report", 0)
@@ -25,19 +39,21 @@ def generate_report(cursor: psycopg2.extensions.cursor, save_path: str) -> None:
         p.add_run(" ч.")
 
     book_to_quantity = get_most_popular_books(cursor)
-    plt_save_path = f"{save_path}.jpg"
+    plot = io.BytesIO()
 
     index = np.arange(len(book_to_quantity))
     values = list(book_to_quantity.values())
 
+    figure = plt.figure()
     plt.bar(index, values)
     plt.xticks(index, range(1, len(book_to_quantity) + 1))
     plt.title("Самые читаемые книги")
     plt.xlabel("Номер книги")
     plt.ylabel("Количество читателей")
-    plt.savefig(plt_save_path)
+    plt.savefig(plot, format="jpg")
+    plt.close(figure)
 
-    document.add_picture(plt_save_path, Inches(4.5))
+    document.add_picture(plot, Inches(4.5))
 
     p = document.add_paragraph("Соответствие номера с названием книги: \n")
     for index, book_title in enumerate(book_to_quantity.keys(), start=1):
@@ -62,7 +78,7 @@ def generate_report(cursor: psycopg2.extensions.cursor, save_path: str) -> None:
         row_cells[2].text = last_name
         row_cells[3].text = str(book_count)
 
-    document.save(save_path)
+    document.save(str(save_path))
 
 
 def get_average_returnment_time(cursor: psycopg2.extensions.cursor) -> timedelta | None:
@@ -99,3 +115,37 @@ def get_offenders_debts(cursor: psycopg2.extensions.cursor) -> list[tuple[Any, .
     cursor.execute(sql)
 
     return cursor.fetchall()
+
+
+async def get_report_job_or_404(cursor: aiopg.Cursor, job_id: int) -> ReportJob:
+    if (job := await get_report_job(cursor, job_id)) is None:
+        raise NotFoundException
+
+    return job
+
+
+async def wait_for_report_job(job: ReportJob, timeout: timedelta) -> ReportJob:
+    """Polls the job until it is finished or `timeout` passes, without holding a connection in between."""
+
+    deadline = time.monotonic() + timeout.total_seconds()
+
+    while job.status not in (ReportStatus.FAILED, ReportStatus.DONE) and time.monotonic() < deadline:
+        await asyncio.sleep(config.REPORT_POLL_INTERVAL.total_seconds())
+
+        async with primary_async_cursor() as cursor:
+            job = await get_report_job_or_404(cursor, job.id)
+
+    return job
+
+
+def get_report_path(job: ReportJob) -> Path:
+    if job.status == ReportStatus.FAILED:
+        raise ReportFailedException
+
+    if job.status != ReportStatus.DONE or job.artifact is None:
+        raise ReportNotReadyException
+
+    if (report_path := artifact_store.find(job.artifact)) is None:
+        raise ReportExpiredException
+
+    return report_path
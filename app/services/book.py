@@ -1,8 +1,38 @@
-import psycopg2.extensions
+import base64
+import binascii
+import csv
+import json
+import os
+import shutil
+import uuid
+from typing import BinaryIO
 
-from app.core.exceptions import DatabaseException, NotFoundException
-from app.crud import get_one_book
-from app.models import Book, BookUpdate
+import psycopg2.extensions
+from fastapi import UploadFile
+
+from app.core.config import config
+from app.core.exceptions import (
+    InvalidCursorException,
+    InvalidSortException,
+    NotFoundException,
+)
+from app.crud import (
+    create_book_import_job,
+    get_book_import_job,
+    get_one_book,
+    import_books,
+    refresh_book_catalog,
+)
+from app.crud.book import BOOK_SORT_KEYS
+from app.models import (
+    Book,
+    BookImportJob,
+    BookImportResult,
+    BookPage,
+    BookSort,
+    BookUpdate,
+)
+from app.services.validators import validate_author_ids
 
 
 def get_book_or_404(cursor: psycopg2.extensions.cursor, book_id: int) -> Book:
@@ -13,50 +43,173 @@ def get_book_or_404(cursor: psycopg2.extensions.cursor, book_id: int) -> Book:
     return book
 
 
-def insert_books(cursor: psycopg2.extensions.cursor, books: list[dict]) -> int:
-    book_count = 0
+def encode_book_cursor(page: BookPage, sort_key: list) -> str:
+    """The cursor is opaque to clients, it remembers the sorting it was made for and where the page ended.
+
+    `sort_key` is the one of the last book of the page, see `get_sort_key`.
+    """
+
+    # Postgres prints whole floats without a fraction, while cursors are type checked when decoded
+    sort_key = [Book.__fields__[column].type_(value) for column, value in zip(BOOK_SORT_KEYS[page.sort], sort_key)]
+    cursor = [page.sort, page.desc, sort_key]
+
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def get_book_page(
+    sort: BookSort | None, desc: bool | None, after: str | None, limit: int | None, searching: bool = False
+) -> BookPage:
+    """Search results are sorted by relevance, the most relevant first, unless another sorting is requested."""
+
+    if sort is None:
+        sort = BookSort.RELEVANCE if searching else BookSort.TITLE
+    elif sort == BookSort.RELEVANCE and not searching:
+        raise InvalidSortException
+    if desc is None:
+        desc = sort == BookSort.RELEVANCE
+
+    page = BookPage(sort=sort, desc=desc, limit=limit)
+
+    if after is None:
+        return page
+
+    try:
+        cursor_sort, cursor_desc, sort_key = json.loads(base64.urlsafe_b64decode(after.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursorException
+
+    sort_columns = BOOK_SORT_KEYS[sort]
+
+    if (cursor_sort, cursor_desc) != (sort, desc):
+        raise InvalidCursorException
+    if not isinstance(sort_key, list) or len(sort_key) != len(sort_columns):
+        raise InvalidCursorException
+    if not all(isinstance(value, Book.__fields__[column].type_) for column, value in zip(sort_columns, sort_key)):
+        raise InvalidCursorException
+
+    page.after = sort_key
+
+    return page
+
+
+def get_search_parameters(
+    availability: bool | None, authors: str | None, min: int | None, max: int | None
+) -> dict:
+    search_parameters = {}
+
+    if availability != None:
+        search_parameters["availability"] = availability
+    if authors:
+        search_parameters["authors"] = validate_author_ids(authors)
+    if min is not None:
+        search_parameters["min"] = min
+    if max is not None:
+        search_parameters["max"] = max
+
+    return search_parameters
+
+
+# Column sizes of `book` and `author`
+MAX_TITLE_LENGTH = 50
+MAX_ISBN_LENGTH = 50
+MAX_AUTHOR_NAME_LENGTH = 50
+MAX_AUTHOR_ORIGIN_LENGTH = 200
+
+
+def parse_book_row(book: dict) -> tuple[str, str, int, list[tuple[str, str, str]]]:
+    """Raises `ValueError` for malformed rows, see `import_books` in `app/routers/book.py` for the format."""
+
+    if None in (book.get("book_title"), book.get("isbn"), book.get("num_of_pages"), book.get("authors")):
+        raise ValueError("Missing columns")
 
-    for book in books:
-        cursor.execute(
-            """INSERT INTO book (title, isbn, num_pages) VALUES (%s, %s, %s) ON CONFLICT (title, isbn) DO NOTHING RETURNING id""",
-            (book["book_title"].strip(), book["isbn"].strip(), book["num_of_pages"].strip()),
-        )
-        record = cursor.fetchone()
+    title, isbn = book["book_title"].strip(), book["isbn"].strip()
+    num_pages = int(book["num_of_pages"].strip())
 
-        if record:
+    if not 0 < len(title) <= MAX_TITLE_LENGTH or not 0 < len(isbn) <= MAX_ISBN_LENGTH or num_pages < 0:
+        raise ValueError("Invalid book")
 
-            book_id = record[0]
+    authors = []
+    for author in list(map(str.strip, book["authors"].split(","))):
+        author, author_origin = author.rsplit(maxsplit=1)
+        author_name, author_surname = author.split()
 
-            authors = []
-            for author in list(map(str.strip, book["authors"].split(","))):
-                author, author_origin = author.rsplit(maxsplit=1)
-                author_name, author_surname = author.split()
-                authors.append((author_name, author_surname, author_origin))
+        if max(len(author_name), len(author_surname)) > MAX_AUTHOR_NAME_LENGTH:
+            raise ValueError("Invalid author")
+        if len(author_origin) > MAX_AUTHOR_ORIGIN_LENGTH:
+            raise ValueError("Invalid author")
 
-            authors_ids = []
-            for author in authors:
-                cursor.execute("""SELECT id from author WHERE (first_name, last_name, origin) = %s""", (author,))
-                record = cursor.fetchone()
-                if record:
-                    authors_ids.append(record[0])
+        authors.append((author_name, author_surname, author_origin))
 
-            cursor.execute(
-                f"""
-                    INSERT INTO author (first_name, last_name, origin) VALUES {','.join(list(map(str, authors)))}
-                    ON CONFLICT DO NOTHING RETURNING id
-                """,
-            )
-            authors_ids.extend(list(map(lambda x: x[0], cursor.fetchall())))
+    return title, isbn, num_pages, authors
 
-            book_author_values = [str((book_id, author_id)) for author_id in authors_ids]
 
-            cursor.execute(
-                f"""INSERT INTO book_author (book_id, author_id) VALUES {','.join(book_author_values)}""",
-            )
+BOOK_CSV_FIELDNAMES = ["book_title", "isbn", "num_of_pages", "authors"]
 
-            book_count += 1
 
-    return book_count
+def read_book_rows(file: BinaryIO, max_lines: int) -> tuple[list[dict], int]:
+    """Reads the next `max_lines` lines of a CSV upload. Returns the rows and the number of lines read.
+
+    Lines that aren't valid UTF-8 come back as empty rows, so that `insert_books` rejects them.
+    """
+
+    books = []
+    lines = 0
+
+    while lines < max_lines and (line := file.readline()):
+        lines += 1
+
+        try:
+            text = line.decode()
+        except UnicodeDecodeError:
+            books.append({})
+            continue
+
+        books.extend(csv.DictReader([text], fieldnames=BOOK_CSV_FIELDNAMES, delimiter=";"))
+
+    return books, lines
+
+
+def spool_book_import(cursor: psycopg2.extensions.cursor, user_id: int, csv_file: UploadFile) -> BookImportJob:
+    """Saves the upload where the celery worker finds it and creates the job importing it."""
+
+    os.makedirs(config.BOOK_IMPORT_FOLDER, exist_ok=True)
+    path = f"{config.BOOK_IMPORT_FOLDER}/{uuid.uuid4()}.csv"
+
+    with open(path, "wb") as file:
+        shutil.copyfileobj(csv_file.file, file)
+
+    job_id = create_book_import_job(cursor, user_id, csv_file.filename or path, path)
+
+    return get_book_import_job(cursor, job_id)  # type: ignore
+
+
+def get_book_import_job_or_404(cursor: psycopg2.extensions.cursor, job_id: int) -> BookImportJob:
+    if (job := get_book_import_job(cursor, job_id)) is None:
+        raise NotFoundException
+
+    return job
+
+
+def insert_books(cursor: psycopg2.extensions.cursor, books: list[dict]) -> BookImportResult:
+    """Imports the CSV rows with a handful of statements, however many rows there are."""
+
+    book_rows = []
+    author_rows = []
+    rejected = 0
+
+    for line, book in enumerate(books, start=1):
+        try:
+            title, isbn, num_pages, authors = parse_book_row(book)
+        except ValueError:
+            rejected += 1
+            continue
+
+        book_rows.append((line, title, isbn, num_pages))
+        author_rows.extend((line, position, *author) for position, author in enumerate(authors))
+
+    inserted = len(import_books(cursor, book_rows, author_rows)) if book_rows else 0
+
+    return BookImportResult(inserted=inserted, duplicates=len(book_rows) - inserted, rejected=rejected)
 
 def update_single_book(cursor: psycopg2.extensions.cursor, book_id: int, book: BookUpdate):
 
@@ -73,3 +226,5 @@ def update_single_book(cursor: psycopg2.extensions.cursor, book_id: int, book: B
 
     for author in book.authors:
         cursor.execute("INSERT INTO book_author(book_id,author_id) VALUES (%s, %s)", (book_id, author))
+
+    refresh_book_catalog(cursor, [book_id])
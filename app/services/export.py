@@ -0,0 +1,87 @@
+import io
+import shutil
+import zipfile
+import zlib
+from datetime import datetime
+from typing import IO, Generator, Iterable, Iterator
+
+import psycopg2.extensions
+
+from app.core.exceptions import CompressionUnavailableException
+from app.crud import SnapshotExport, WriteStream, copy_delta
+from app.models import ExportCompression
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # optional, zstd exports are refused without it
+    zstandard = None
+
+EXPORT_MEDIA_TYPES = {
+    None: "text/csv",
+    ExportCompression.GZIP: "application/gzip",
+    ExportCompression.ZSTD: "application/zstd",
+}
+
+EXPORT_FILE_SUFFIXES = {
+    None: "",
+    ExportCompression.GZIP: ".gz",
+    ExportCompression.ZSTD: ".zst",
+}
+
+
+def validate_compression(compression: ExportCompression | None):
+    if compression == ExportCompression.ZSTD and zstandard is None:
+        raise CompressionUnavailableException(compression.value)
+
+
+def compress_chunks(chunks: Iterable[bytes], compression: ExportCompression | None) -> Iterator[bytes]:
+    """Compresses a stream on the fly, chunk by chunk."""
+
+    if compression is None:
+        yield from chunks
+        return
+
+    if compression == ExportCompression.GZIP:
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)  # gzip header and trailer
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()  # type: ignore
+
+    for chunk in chunks:
+        if data := compressor.compress(chunk):
+            yield data
+
+    yield compressor.flush()
+
+
+def stream_zip(files: Generator[tuple[str, IO[bytes]], None, None]) -> WriteStream:
+    """Zip archive of the files, (name, data) pairs, streamed while the files are still being produced."""
+
+    def write(pipe):
+        try:
+            with zipfile.ZipFile(pipe, "w", zipfile.ZIP_DEFLATED) as archive:
+                for filename, data in files:
+                    with data, archive.open(filename, "w", force_zip64=True) as entry:
+                        shutil.copyfileobj(data, entry)
+        finally:
+            files.close()  # stops the producers when the archive is given up
+
+    return WriteStream(write)
+
+
+def stream_database_zip(export: SnapshotExport) -> WriteStream:
+    """Zip archive of all tables, a CSV file per table, taken from one snapshot of the database.
+
+    The tables go into the archive in the order their COPYs finish, while it is sent.
+    """
+
+    return stream_zip((f"{table_name}.csv", data) for table_name, data in export.copy_tables())
+
+
+def stream_delta_zip(cursor: psycopg2.extensions.cursor, since: datetime | None, watermark: datetime) -> WriteStream:
+    """Zip archive of the rows changed and deleted since `since`, see `copy_delta`, and of the watermark."""
+
+    def files():
+        yield from ((f"{table_name}.csv", data) for table_name, data in copy_delta(cursor, since, watermark))
+        yield "watermark.txt", io.BytesIO(watermark.isoformat().encode())
+
+    return stream_zip(files())
@@ -4,6 +4,8 @@ import psycopg2.extensions
 
 from app.core.config import config
 from app.core.exceptions import (
+    InvalidAuthorsException,
+    InvalidBookIdsException,
     InvalidOrderStatusException,
     NotFoundException,
     TableNotExistsException,
@@ -12,7 +14,7 @@ from app.core.exceptions import (
     UserExistsException,
     UserIsOffender,
 )
-from app.crud import get_books_from_ids, get_table_names, get_unavailable_books
+from app.crud import get_books_from_ids, get_table_names, get_unavailable_books_from_ids
 from app.models import OrderStatus
 
 
@@ -29,12 +31,8 @@ def validate_order_status(cursor: psycopg2.extensions.cursor, order_id: int):
 
 
 def validate_order_books_available(cursor: psycopg2.extensions.cursor, books_ids: list[int]):
-    unavailable_books = {book.id: book for book in get_unavailable_books(cursor)}
-
-    if unavailable_ordered_books_ids := set(books_ids) & unavailable_books.keys():
-        unavailable_books_response = ", ".join(
-            [f"`{book_id} - {unavailable_books[book_id].title}`" for book_id in unavailable_ordered_books_ids]
-        )
+    if unavailable_books := get_unavailable_books_from_ids(cursor, books_ids):
+        unavailable_books_response = ", ".join([f"`{book.id} - {book.title}`" for book in unavailable_books])
         raise UnavailableBooksException(unavailable_books=unavailable_books_response)
 
 
@@ -69,3 +67,22 @@ def validate_table_existence(cursor: psycopg2.extensions.cursor, table_name: str
 def validate_data_folder_existence():
     if not os.path.exists(config.TABLE_DATA_FOLDER):
         os.mkdir(config.TABLE_DATA_FOLDER)
+
+
+def validate_author_ids(authors: str) -> list[int]:
+    try:
+        return [int(author_id) for author_id in authors.split(",")]
+    except ValueError:
+        raise InvalidAuthorsException
+
+
+def validate_book_ids(ids: str) -> list[int]:
+    try:
+        book_ids = [int(book_id) for book_id in ids.split(",")]
+    except ValueError:
+        raise InvalidBookIdsException
+
+    if len(book_ids) > 100:
+        raise InvalidBookIdsException
+
+    return book_ids
@@ -1,5 +1,11 @@
+from .analytics import generate_report_file
+from .artifacts import cleanup_artifacts
+from .book import import_books_file
 from .order import mark_user_as_offender
 
 __all__ = [
+    "cleanup_artifacts",
+    "generate_report_file",
+    "import_books_file",
     "mark_user_as_offender",
 ]
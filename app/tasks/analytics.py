@@ -0,0 +1,45 @@
+import psycopg2
+import psycopg2.extras
+
+from app.core.artifacts import artifact_store
+from app.crud import begin_report_snapshot, get_report_job, set_report_job_status
+from app.db import create_connection
+from app.models import ReportStatus
+from app.services import generate_report
+from app.tasks.celery import celery
+
+
+# Acknowledged only once it is done, so that the broker hands the job to another worker if this one dies
+@celery.task(acks_late=True, reject_on_worker_lost=True)
+def generate_report_file(job_id: int):
+    conn = create_connection()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+    try:
+        job = get_report_job(cursor, job_id)
+        if job is None or job.status in (ReportStatus.FAILED, ReportStatus.DONE):
+            return
+
+        set_report_job_status(cursor, job_id, ReportStatus.RUNNING)
+        conn.commit()
+
+        # The version is read in the snapshot the report is made of, so it describes exactly that data
+        version = begin_report_snapshot(cursor)
+        if (report_path := artifact_store.get("report", version)) is None:
+            report_path = artifact_store.put(
+                "report", ".docx", lambda path: generate_report(cursor, path), version=version
+            )
+        conn.rollback()
+
+        set_report_job_status(cursor, job_id, ReportStatus.DONE, artifact=report_path.name)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        try:
+            set_report_job_status(cursor, job_id, ReportStatus.FAILED, error=f"{type(e).__name__}: {e}")
+            conn.commit()
+        except psycopg2.Error:
+            pass
+        raise
+    finally:
+        conn.close()
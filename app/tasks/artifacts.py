@@ -0,0 +1,7 @@
+from app.core.artifacts import artifact_store
+from app.tasks.celery import celery
+
+
+@celery.task
+def cleanup_artifacts():
+    artifact_store.evict()
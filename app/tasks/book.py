@@ -0,0 +1,67 @@
+import os
+
+import psycopg2
+import psycopg2.extras
+
+from app.core.config import config
+from app.crud import (
+    checkpoint_book_import_job,
+    get_book_import_job,
+    lock_book_import_job,
+    set_book_import_job_status,
+)
+from app.db import create_connection
+from app.models import BookImportStatus
+from app.services import insert_books, read_book_rows
+from app.tasks.celery import celery
+
+
+# Acknowledged only once it is done, so that the broker hands the job to another worker if this one dies
+@celery.task(acks_late=True, reject_on_worker_lost=True)
+def import_books_file(job_id: int):
+    """Imports an uploaded CSV file chunk by chunk.
+
+    Every chunk is committed together with a checkpoint of the job, a job that is run again continues
+    after the last committed chunk.
+    """
+
+    conn = create_connection()
+    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+    try:
+        if not lock_book_import_job(cursor, job_id):
+            return
+
+        job = get_book_import_job(cursor, job_id)
+        if job is None or job.status == BookImportStatus.DONE:
+            return
+
+        set_book_import_job_status(cursor, job_id, BookImportStatus.RUNNING)
+        conn.commit()
+
+        with open(job.path, "rb") as file:
+            file.seek(job.byte_offset)
+
+            while True:
+                books, lines = read_book_rows(file, config.BOOK_IMPORT_CHUNK_SIZE)
+                if not lines:
+                    break
+
+                result = insert_books(cursor, books)
+                checkpoint_book_import_job(cursor, job_id, file.tell(), lines, result)
+                conn.commit()
+
+        set_book_import_job_status(cursor, job_id, BookImportStatus.DONE)
+        conn.commit()
+
+        os.remove(job.path)
+    except Exception as e:
+        conn.rollback()
+        try:
+            set_book_import_job_status(cursor, job_id, BookImportStatus.FAILED, f"{type(e).__name__}: {e}")
+            conn.commit()
+        except psycopg2.Error:
+            pass
+        raise
+    finally:
+        conn.close()
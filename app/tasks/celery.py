@@ -6,3 +6,10 @@ celery = Celery(__name__)
 
 celery.conf.broker_url = config.CELERY_BROKER_URL
 celery.conf.result_backend = config.CELERY_RESULT_BACKEND
+
+celery.conf.beat_schedule = {
+    "cleanup-artifacts": {
+        "task": "app.tasks.artifacts.cleanup_artifacts",
+        "schedule": config.ARTIFACT_CLEANUP_INTERVAL,
+    },
+}
@@ -0,0 +1,31 @@
+-- Columns the application relies on that older databases were created without.
+ALTER TABLE book ADD COLUMN IF NOT EXISTS description TEXT NOT NULL DEFAULT '';
+ALTER TABLE book ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+ALTER TABLE user_ ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP;
+
+-- Seed data is inserted with explicit ids, which leaves id sequences behind MAX(id).
+-- Lists every id sequence whose next value is already taken.
+CREATE OR REPLACE FUNCTION sequence_drift()
+RETURNS TABLE (sequence_name TEXT, next_value BIGINT, max_id BIGINT) AS $$
+DECLARE
+  col RECORD;
+BEGIN
+  FOR col IN
+    SELECT c.table_name, c.column_name, pg_get_serial_sequence(c.table_name, c.column_name) AS seq
+    FROM information_schema.columns c
+    WHERE c.table_schema = 'public' AND c.column_default LIKE 'nextval(%'
+  LOOP
+    sequence_name := col.seq;
+    EXECUTE format('SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM %s', col.seq)
+      INTO next_value;
+    EXECUTE format('SELECT COALESCE(MAX(%I), 0) FROM %I', col.column_name, col.table_name)
+      INTO max_id;
+
+    IF max_id >= next_value THEN
+      RETURN NEXT;
+    END IF;
+  END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+SELECT setval(sequence_name, max_id) FROM sequence_drift();
@@ -0,0 +1,45 @@
+-- insert_books relies on ON CONFLICT (title, isbn), which needs a matching unique constraint. Imports made before
+-- could insert the same book twice, so duplicates are merged into the one with the lowest id first. The merged book
+-- stays visible if any of its copies was not deleted.
+CREATE TEMPORARY TABLE book_duplicate ON COMMIT DROP AS
+  SELECT id, keep_id
+  FROM (SELECT id, MIN(id) OVER (PARTITION BY title, isbn) AS keep_id FROM book) AS books
+  WHERE id <> keep_id;
+
+UPDATE book SET deleted_at = NULL
+FROM book_duplicate d
+JOIN book copy ON copy.id = d.id
+WHERE book.id = d.keep_id AND copy.deleted_at IS NULL;
+
+UPDATE book_author SET book_id = d.keep_id FROM book_duplicate d WHERE book_author.book_id = d.id;
+UPDATE book_order SET book_id = d.keep_id FROM book_duplicate d WHERE book_order.book_id = d.id;
+UPDATE offender SET book_id = d.keep_id FROM book_duplicate d WHERE offender.book_id = d.id;
+
+-- Both copies may have listed the same author
+DELETE FROM book_author
+USING book_author earlier
+WHERE book_author.book_id = earlier.book_id
+  AND book_author.author_id = earlier.author_id
+  AND book_author.id > earlier.id
+  AND book_author.book_id IN (SELECT keep_id FROM book_duplicate);
+
+DELETE FROM book USING book_duplicate d WHERE book.id = d.id;
+
+ALTER TABLE book ADD CONSTRAINT uq_book UNIQUE (title, isbn);
+
+-- Author lists of a book (BOOK_SQL joins) and books of an author (author filter).
+CREATE INDEX ix_book_author_book_id ON book_author (book_id, author_id);
+CREATE INDEX ix_book_author_author_id ON book_author (author_id, book_id);
+
+-- Open loans: `bo.date_finished IS NULL AND o.status = 2` in the availability checks.
+CREATE INDEX ix_book_order_open ON book_order (book_id, order_id) WHERE date_finished IS NULL;
+CREATE INDEX ix_order_approved ON order_ (id, user_id) WHERE status = 2;
+
+-- Books of an order (get_books_by_order, reject_order).
+CREATE INDEX ix_book_order_order_id ON book_order (order_id);
+
+-- Orders of a user (get_orders, get_books_taken_by_user).
+CREATE INDEX ix_order_user_id ON order_ (user_id, status);
+
+-- validate_user_is_not_offender.
+CREATE INDEX ix_offender_user_id ON offender (user_id, book_id);
@@ -0,0 +1,46 @@
+-- Denormalized read model for the catalog: one row per book with its authors ready to serve.
+-- Kept current by calling refresh_book_catalog() for the books a write touched.
+CREATE TABLE book_catalog (
+  id BIGINT PRIMARY KEY REFERENCES book(id),
+  title VARCHAR(50) NOT NULL,
+  isbn VARCHAR(50) NOT NULL,
+  num_pages BIGINT NOT NULL,
+  image_url TEXT,
+  description TEXT NOT NULL,
+  deleted_at TIMESTAMP,
+  author_ids BIGINT[] NOT NULL,
+  authors JSONB NOT NULL
+);
+
+CREATE INDEX ix_book_catalog_title ON book_catalog (title, isbn) WHERE deleted_at IS NULL;
+CREATE INDEX ix_book_catalog_author_ids ON book_catalog USING GIN (author_ids);
+
+CREATE FUNCTION refresh_book_catalog(book_ids BIGINT[]) RETURNS VOID AS $$
+  INSERT INTO book_catalog (id, title, isbn, num_pages, image_url, description, deleted_at, author_ids, authors)
+  SELECT
+    b.id, b.title, b.isbn, b.num_pages, b.image_url, b.description, b.deleted_at,
+    COALESCE(array_agg(a.id ORDER BY ba.id) FILTER (WHERE a.id IS NOT NULL), '{}'),
+    COALESCE(
+      jsonb_agg(
+        jsonb_build_object('id', a.id, 'first_name', a.first_name, 'last_name', a.last_name, 'origin', a.origin)
+        ORDER BY ba.id
+      ) FILTER (WHERE a.id IS NOT NULL),
+      '[]'
+    )
+  FROM book b
+  LEFT JOIN book_author ba ON ba.book_id = b.id
+  LEFT JOIN author a ON a.id = ba.author_id
+  WHERE b.id = ANY(book_ids)
+  GROUP BY b.id
+  ON CONFLICT (id) DO UPDATE SET
+    title = EXCLUDED.title,
+    isbn = EXCLUDED.isbn,
+    num_pages = EXCLUDED.num_pages,
+    image_url = EXCLUDED.image_url,
+    description = EXCLUDED.description,
+    deleted_at = EXCLUDED.deleted_at,
+    author_ids = EXCLUDED.author_ids,
+    authors = EXCLUDED.authors;
+$$ LANGUAGE sql;
+
+SELECT refresh_book_catalog(ARRAY(SELECT id FROM book));
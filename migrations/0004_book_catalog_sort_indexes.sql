@@ -0,0 +1,2 @@
+-- Keyset pagination of GET /books/. Sorting by title is served by ix_book_catalog_title and by id by the primary key.
+CREATE INDEX ix_book_catalog_num_pages ON book_catalog (num_pages, id) WHERE deleted_at IS NULL;
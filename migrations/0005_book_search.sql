@@ -0,0 +1,12 @@
+-- Full-text search over the catalog, with trigram matching of titles for typos and unfinished words.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- The russian configuration stems Latin words with the english stemmer, so one vector covers both languages.
+ALTER TABLE book_catalog ADD COLUMN search_vector TSVECTOR GENERATED ALWAYS AS (
+  setweight(to_tsvector('russian', title), 'A') ||
+  setweight(jsonb_to_tsvector('russian', authors, '["string"]'), 'B') ||
+  setweight(to_tsvector('russian', description), 'C')
+) STORED;
+
+CREATE INDEX ix_book_catalog_search_vector ON book_catalog USING GIN (search_vector);
+CREATE INDEX ix_book_catalog_title_trgm ON book_catalog USING GIN (title gin_trgm_ops);
@@ -0,0 +1,14 @@
+-- Lets the API workers drop their cached catalog data (app/core/cache.py) once a change is committed.
+-- Notifications are delivered on commit and identical ones are sent once per transaction.
+CREATE FUNCTION notify_catalog_changed() RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('catalog_changed', '');
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER book_catalog_notify_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON book_catalog
+  FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+
+CREATE TRIGGER author_notify_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON author
+  FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
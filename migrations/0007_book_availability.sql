@@ -0,0 +1,68 @@
+-- Availability of a book is stored on it instead of being derived from the loan history on every read.
+-- loan_order_id is the approved order the book is lent out with, NULL when the book is available.
+ALTER TABLE book
+  ADD COLUMN loan_order_id BIGINT REFERENCES order_(id),
+  ADD COLUMN borrower_id BIGINT REFERENCES user_(id);
+
+ALTER TABLE book_catalog
+  ADD COLUMN loan_order_id BIGINT,
+  ADD COLUMN borrower_id BIGINT;
+
+CREATE INDEX ix_book_catalog_on_loan ON book_catalog (loan_order_id) WHERE loan_order_id IS NOT NULL;
+CREATE INDEX ix_book_catalog_borrower_id ON book_catalog (borrower_id) WHERE borrower_id IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION refresh_book_catalog(book_ids BIGINT[]) RETURNS VOID AS $$
+  INSERT INTO book_catalog (
+    id, title, isbn, num_pages, image_url, description, deleted_at, loan_order_id, borrower_id, author_ids, authors
+  )
+  SELECT
+    b.id, b.title, b.isbn, b.num_pages, b.image_url, b.description, b.deleted_at, b.loan_order_id, b.borrower_id,
+    COALESCE(array_agg(a.id ORDER BY ba.id) FILTER (WHERE a.id IS NOT NULL), '{}'),
+    COALESCE(
+      jsonb_agg(
+        jsonb_build_object('id', a.id, 'first_name', a.first_name, 'last_name', a.last_name, 'origin', a.origin)
+        ORDER BY ba.id
+      ) FILTER (WHERE a.id IS NOT NULL),
+      '[]'
+    )
+  FROM book b
+  LEFT JOIN book_author ba ON ba.book_id = b.id
+  LEFT JOIN author a ON a.id = ba.author_id
+  WHERE b.id = ANY(book_ids)
+  GROUP BY b.id
+  ON CONFLICT (id) DO UPDATE SET
+    title = EXCLUDED.title,
+    isbn = EXCLUDED.isbn,
+    num_pages = EXCLUDED.num_pages,
+    image_url = EXCLUDED.image_url,
+    description = EXCLUDED.description,
+    deleted_at = EXCLUDED.deleted_at,
+    loan_order_id = EXCLUDED.loan_order_id,
+    borrower_id = EXCLUDED.borrower_id,
+    author_ids = EXCLUDED.author_ids,
+    authors = EXCLUDED.authors;
+$$ LANGUAGE sql;
+
+-- Loans change far more often than the rest of a book, so they are copied to the catalog on their own
+CREATE FUNCTION sync_book_catalog_loan() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE book_catalog SET loan_order_id = NEW.loan_order_id, borrower_id = NEW.borrower_id WHERE id = NEW.id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER book_sync_catalog_loan AFTER UPDATE OF loan_order_id, borrower_id ON book
+  FOR EACH ROW EXECUTE FUNCTION sync_book_catalog_loan();
+
+-- Loans don't affect the cached filters and authors
+DROP TRIGGER book_catalog_notify_changed ON book_catalog;
+CREATE TRIGGER book_catalog_notify_changed
+  AFTER INSERT OR DELETE OR TRUNCATE
+    OR UPDATE OF title, isbn, num_pages, image_url, description, deleted_at, author_ids, authors
+  ON book_catalog
+  FOR EACH STATEMENT EXECUTE FUNCTION notify_catalog_changed();
+
+UPDATE book SET loan_order_id = o.id, borrower_id = o.user_id
+FROM book_order bo
+JOIN order_ o ON o.id = bo.order_id
+WHERE bo.book_id = book.id AND bo.date_finished IS NULL AND o.status = 2;
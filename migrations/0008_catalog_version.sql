@@ -0,0 +1,21 @@
+-- Single-row counter bumped by every transaction that changes the catalog, books, authors or loans.
+-- It is the ETag of the catalog endpoints. Being a row, a new version is only visible once the change is committed.
+CREATE TABLE catalog_version (
+  id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+  version BIGINT NOT NULL
+);
+
+INSERT INTO catalog_version (version) VALUES (1);
+
+CREATE FUNCTION bump_catalog_version() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE catalog_version SET version = version + 1;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER book_catalog_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON book_catalog
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+CREATE TRIGGER author_bump_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON author
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
@@ -0,0 +1,18 @@
+-- CSV imports run in the background. The job row is also the checkpoint: it is updated in the same transaction
+-- as every chunk of the file, so a resumed job continues right after the last committed chunk.
+CREATE TABLE book_import_job (
+  id BIGSERIAL PRIMARY KEY,
+  user_id BIGINT NOT NULL,
+  filename TEXT NOT NULL,
+  path TEXT NOT NULL,
+  status SMALLINT NOT NULL,
+  byte_offset BIGINT NOT NULL DEFAULT 0,
+  lines_processed BIGINT NOT NULL DEFAULT 0,
+  inserted BIGINT NOT NULL DEFAULT 0,
+  duplicates BIGINT NOT NULL DEFAULT 0,
+  rejected BIGINT NOT NULL DEFAULT 0,
+  error TEXT,
+  created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  FOREIGN KEY (user_id) REFERENCES user_ (id)
+);
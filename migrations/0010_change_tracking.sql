@@ -0,0 +1,43 @@
+-- Change tracking for delta exports. Every insert and update stamps the row with the start of its transaction,
+-- hard deletes leave a tombstone behind. Soft deleted books are updates, they show up with their deleted_at set.
+CREATE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at = NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE row_tombstone (
+  id BIGSERIAL PRIMARY KEY,
+  table_name TEXT NOT NULL,
+  row_id BIGINT NOT NULL,
+  deleted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX ix_row_tombstone_deleted_at ON row_tombstone (deleted_at);
+
+CREATE FUNCTION record_tombstone() RETURNS TRIGGER AS $$
+BEGIN
+  INSERT INTO row_tombstone (table_name, row_id) VALUES (TG_TABLE_NAME, OLD.id);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  table_name TEXT;
+BEGIN
+  FOREACH table_name IN ARRAY ARRAY['author', 'book', 'book_author', 'order_', 'book_order'] LOOP
+    EXECUTE format('ALTER TABLE %I ADD COLUMN updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()', table_name);
+    EXECUTE format('CREATE INDEX %I ON %I (updated_at)', 'ix_' || table_name || '_updated_at', table_name);
+    EXECUTE format(
+      'CREATE TRIGGER %I BEFORE INSERT OR UPDATE ON %I FOR EACH ROW EXECUTE FUNCTION set_updated_at()',
+      table_name || '_set_updated_at', table_name
+    );
+    EXECUTE format(
+      'CREATE TRIGGER %I AFTER DELETE ON %I FOR EACH ROW EXECUTE FUNCTION record_tombstone()',
+      table_name || '_record_tombstone', table_name
+    );
+  END LOOP;
+END;
+$$;
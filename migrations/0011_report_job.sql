@@ -0,0 +1,12 @@
+-- Reports are generated in the background. The partial unique index allows one pending (1) or running (2) job
+-- at a time, so concurrent requests for a report join the job in progress instead of starting their own.
+CREATE TABLE report_job (
+  id BIGSERIAL PRIMARY KEY,
+  status SMALLINT NOT NULL,
+  artifact TEXT,
+  error TEXT,
+  created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX report_job_single_flight_idx ON report_job ((TRUE)) WHERE status IN (1, 2);
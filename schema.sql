@@ -8,7 +8,8 @@ CREATE TABLE IF NOT EXISTS user_ (
   first_name VARCHAR(50) NOT NULL,
   last_name VARCHAR(50),
   password VARCHAR(200) NOT NULL,
-  role SMALLINT NOT NULL DEFAULT 1
+  role SMALLINT NOT NULL DEFAULT 1,
+  deleted_at TIMESTAMP
 );
 CREATE TABLE IF NOT EXISTS author (
   id BIGSERIAL PRIMARY KEY,
@@ -23,7 +24,9 @@ CREATE TABLE IF NOT EXISTS book (
   title VARCHAR(50) NOT NULL,
   isbn VARCHAR(50) NOT NULL,
   num_pages BIGINT NOT NULL,
-  image_url TEXT DEFAULT 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcT3u0UEA-Gfpsphl2gdxxbhnVoJ1NP_o0LV3Q&usqp=CAU'
+  image_url TEXT DEFAULT 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcT3u0UEA-Gfpsphl2gdxxbhnVoJ1NP_o0LV3Q&usqp=CAU',
+  description TEXT NOT NULL DEFAULT '',
+  deleted_at TIMESTAMP
 );
 CREATE TABLE IF NOT EXISTS book_author (
   id BIGSERIAL PRIMARY KEY,
@@ -102,3 +105,12 @@ INSERT INTO offender (user_id, book_id) VALUES
     (4, 1),
     (4, 2)
 ;
+
+-- seed data above uses explicit ids, move sequences past them
+SELECT setval('user__id_seq', (SELECT MAX(id) FROM user_));
+SELECT setval('book_id_seq', (SELECT MAX(id) FROM book));
+SELECT setval('author_id_seq', (SELECT MAX(id) FROM author));
+SELECT setval('book_author_id_seq', (SELECT MAX(id) FROM book_author));
+SELECT setval('order__id_seq', (SELECT MAX(id) FROM order_));
+SELECT setval('book_order_id_seq', (SELECT MAX(id) FROM book_order));
+SELECT setval('offender_id_seq', (SELECT MAX(id) FROM offender));
@@ -0,0 +1,112 @@
+import os
+from pathlib import Path
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+from app.migrations import apply_migrations, reconcile_sequences
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "schema.sql"
+
+# Sizes of the seeded tables, large enough for Postgres to prefer an index wherever one fits the query
+SEED_BOOKS = 50_000
+SEED_AUTHORS = 5_000
+SEED_USERS = 10_000
+SEED_ORDERS = 50_000
+
+# Books get one or two authors, about 1% of them are on loan and 1% are deleted, and every order has two books.
+# The ids of the rows of schema.sql are taken already, the new rows get theirs from the sequences.
+SEED_SQL = """
+    INSERT INTO author (first_name, last_name, origin)
+    SELECT 'First ' || n, 'Last ' || n, 'Origin ' || n %% 50 FROM generate_series(1, %(authors)s) n;
+
+    INSERT INTO user_ (email, first_name, last_name, password, role)
+    SELECT 'reader' || n || '@example.com', 'Reader', 'N' || n, 'x', CASE WHEN n %% 100 = 0 THEN 2 ELSE 1 END
+    FROM generate_series(1, %(users)s) n;
+
+    INSERT INTO book (title, isbn, num_pages, description, deleted_at)
+    SELECT
+        'Book ' || n, 'ISBN-' || n, 10 + n %% 1500,
+        (ARRAY['war', 'peace', 'crime', 'punishment', 'idiot', 'demons', 'gambler', 'brothers'])[1 + n %% 8]
+            || ' story number ' || n,
+        CASE WHEN n %% 100 = 0 THEN NOW() END
+    FROM generate_series(1, %(books)s) n;
+
+    INSERT INTO book_author (book_id, author_id)
+    SELECT book.id, author.id
+    FROM (SELECT id, row_number() OVER (ORDER BY id) AS n FROM book) book
+    CROSS JOIN LATERAL (
+        VALUES (1 + book.n %% %(authors)s), (CASE WHEN book.n %% 3 = 0 THEN 1 + book.n * 7 %% %(authors)s END)
+    ) pick(n)
+    JOIN (SELECT id, row_number() OVER (ORDER BY id) AS n FROM author) author ON author.n = pick.n;
+
+    INSERT INTO order_ (created_at, user_id, status, requested_books)
+    SELECT NOW() - series.n * INTERVAL '1 minute', user_.id, 1 + series.n %% 3, '1,2'
+    FROM generate_series(1, %(orders)s) series(n)
+    JOIN (SELECT id, row_number() OVER (ORDER BY id) AS n FROM user_) user_ ON user_.n = 1 + series.n %% %(users)s;
+
+    INSERT INTO book_order (order_id, book_id, date_start, date_finished)
+    SELECT order_.id, book.id, order_.created_at, CASE WHEN order_.id %% 50 <> 0 THEN order_.created_at END
+    FROM order_
+    JOIN book ON book.id IN (1 + order_.id %% %(books)s, 1 + (order_.id * 13) %% %(books)s);
+
+    UPDATE book SET loan_order_id = book_order.order_id, borrower_id = order_.user_id
+    FROM book_order
+    JOIN order_ ON order_.id = book_order.order_id
+    WHERE book_order.book_id = book.id AND book_order.date_finished IS NULL AND order_.status = 2;
+
+    INSERT INTO offender (user_id, book_id)
+    SELECT user_.id, 1 + user_.id %% %(books)s FROM user_ WHERE user_.id %% 20 = 0;
+
+    INSERT INTO book_import_job (user_id, filename, path, status)
+    SELECT 2, 'books' || n || '.csv', '/tmp/books' || n || '.csv', 4 FROM generate_series(1, 10000) n;
+
+    INSERT INTO report_job (status, artifact, created_at, updated_at)
+    SELECT 4, 'report-' || n || '.docx', NOW() - n * INTERVAL '1 hour', NOW() - n * INTERVAL '1 hour'
+    FROM generate_series(1, 10000) n;
+
+    INSERT INTO report_job (status) VALUES (1);
+
+    DELETE FROM book_author WHERE id %% 10 = 0;
+"""
+
+
+def get_schema_sql() -> str:
+    """schema.sql creates the database itself, the test database exists already."""
+
+    return SCHEMA_PATH.read_text().split("\\c library", maxsplit=1)[1]
+
+
+@pytest.fixture(scope="session")
+def db() -> psycopg2.extensions.connection:
+    """A connection to TEST_DATABASE_URL, recreated from schema.sql and migrations/ and filled with a large catalog.
+
+    Everything in the public schema of that database is dropped first.
+    """
+
+    dsn = os.environ.get("TEST_DATABASE_URL")
+    if not dsn:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    conn = psycopg2.connect(dsn)
+    cursor = conn.cursor()
+
+    cursor.execute("""DROP SCHEMA public CASCADE; CREATE SCHEMA public""")
+    cursor.execute(get_schema_sql())
+    conn.commit()
+
+    apply_migrations(conn)
+
+    reconcile_sequences(cursor)
+    cursor.execute(SEED_SQL, dict(books=SEED_BOOKS, authors=SEED_AUTHORS, users=SEED_USERS, orders=SEED_ORDERS))
+    cursor.execute("""SELECT refresh_book_catalog(ARRAY(SELECT id FROM book))""")
+    conn.commit()
+
+    conn.autocommit = True
+    cursor.execute("""VACUUM ANALYZE""")
+    conn.autocommit = False
+
+    yield conn
+
+    conn.close()
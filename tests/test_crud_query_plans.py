@@ -0,0 +1,277 @@
+"""The queries of `app.crud` have to be served by the indexes they were written for, see migrations/.
+
+The crud functions run as they are, on a cursor that explains their first query instead of running it, so a test
+breaks when a query or an index changes in a way that makes Postgres scan the table. The async functions get the
+same cursor behind `AsyncCursor`.
+
+Left out are the queries that read every row by design (author and user lists, the page number range, the
+available books, `catalog_version`), plain INSERTs, the import staging tables, function calls and the NDJSON
+stream, which runs the listings checked here on a server-side cursor of its own.
+"""
+
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+
+import psycopg2.extensions
+import psycopg2.extras
+import pytest
+
+from app.crud import analytics, book, user
+from app.crud.aio import analytics as aio_analytics
+from app.crud.aio import book as aio_book
+from app.crud.aio import user as aio_user
+from app.crud.db import CHANGE_TRACKED_TABLES, CHANGED_ROWS_SQL, TOMBSTONES_SQL
+from app.models import (
+    BookImportResult,
+    BookImportStatus,
+    BookPage,
+    BookSort,
+    ReportStatus,
+)
+
+# EXPLAIN takes these, other statements such as PREPARE and SET TRANSACTION run as usual
+EXPLAINABLE_SQL = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|EXECUTE)\b", re.IGNORECASE)
+
+# The listings of books that aren't deleted can be read from any of them
+LISTING_INDEXES = {"ix_book_catalog_title", "ix_book_catalog_num_pages"}
+
+REPORT_VERSION_INDEXES = {
+    "book_order_pkey",
+    "ix_book_order_updated_at",
+    "ix_book_updated_at",
+    "offender_pkey",
+    "row_tombstone_pkey",
+}
+
+PAGE = BookPage(limit=20)
+
+
+class Explained(Exception):
+    def __init__(self, plan: dict) -> None:
+        self.plan = plan
+
+
+class ExplainCursor(psycopg2.extras.DictCursor):
+    def execute(self, query, vars=None):
+        if not EXPLAINABLE_SQL.match(query):
+            return super().execute(query, vars)
+
+        super().execute(f"EXPLAIN (FORMAT JSON) {query}", vars)
+        raise Explained(self.fetchone()[0][0]["Plan"])
+
+
+class AsyncCursor:
+    """Just enough of `aiopg.Cursor` for the crud functions."""
+
+    def __init__(self, cursor: psycopg2.extensions.cursor) -> None:
+        self._cursor = cursor
+        self.connection = cursor.connection
+
+    async def execute(self, query, vars=None):
+        self._cursor.execute(query, vars)
+
+    async def fetchone(self):
+        return self._cursor.fetchone()
+
+    async def fetchall(self):
+        return self._cursor.fetchall()
+
+
+@pytest.fixture
+def cursor(db):
+    cursor = db.cursor(cursor_factory=ExplainCursor)
+
+    yield cursor
+
+    cursor.close()
+    db.rollback()
+
+
+def explain(cursor: psycopg2.extensions.cursor, func, *args) -> dict:
+    """The plan of the first query `func(cursor, *args)` runs."""
+
+    with pytest.raises(Explained) as explained:
+        if asyncio.iscoroutinefunction(func):
+            asyncio.run(func(AsyncCursor(cursor), *args))
+        else:
+            func(cursor, *args)
+
+    return explained.value.plan
+
+
+def get_index_names(plan: dict) -> set[str]:
+    index_names = {plan["Index Name"]} if "Index Name" in plan else set()
+
+    for subplan in plan.get("Plans", []):
+        index_names |= get_index_names(subplan)
+
+    return index_names
+
+
+@pytest.mark.parametrize(
+    "func, args, indexes",
+    [
+        # book
+        pytest.param(book.get_one_book, (123,), {"book_catalog_pkey"}, id="get_one_book"),
+        pytest.param(book.get_all_books, (PAGE,), {"ix_book_catalog_title"}, id="get_all_books"),
+        pytest.param(
+            book.get_all_books,
+            (BookPage(after=["Book 500", "ISBN-500"], limit=20),),
+            {"ix_book_catalog_title"},
+            id="get_all_books-after",
+        ),
+        pytest.param(
+            book.get_all_books,
+            (BookPage(sort=BookSort.NUM_PAGES, desc=True, limit=20),),
+            {"ix_book_catalog_num_pages"},
+            id="get_all_books-num_pages",
+        ),
+        pytest.param(
+            book.filter_books,
+            ({"availability": False}, PAGE),
+            {"ix_book_catalog_title"},
+            id="filter_books-availability",
+        ),
+        pytest.param(
+            book.filter_books,
+            ({"min": 1400, "max": 1401}, PAGE),
+            {"ix_book_catalog_num_pages"},
+            id="filter_books-pages",
+        ),
+        pytest.param(
+            book.filter_books, ({"authors": [7, 8]}, PAGE), {"ix_book_catalog_author_ids"}, id="filter_books-authors"
+        ),
+        pytest.param(
+            book.filter_books,
+            ({}, BookPage(sort=BookSort.RELEVANCE, desc=True, limit=20), "punishment 4242"),
+            {"ix_book_catalog_search_vector", "ix_book_catalog_title_trgm"},
+            id="filter_books-search",
+        ),
+        pytest.param(
+            book.count_filtered_books, ({"authors": [7]},), {"ix_book_catalog_author_ids"}, id="count_filtered_books"
+        ),
+        pytest.param(
+            book.count_books_by_title,
+            ("gambler 4242",),
+            {"ix_book_catalog_search_vector", "ix_book_catalog_title_trgm"},
+            id="count_books_by_title",
+        ),
+        pytest.param(
+            book.get_book_facets,
+            ({"authors": [7]},),
+            {"ix_book_catalog_author_ids", "book_catalog_pkey"},
+            id="get_book_facets",
+        ),
+        pytest.param(book.get_books_from_ids, ([1, 2, 3],), {"book_catalog_pkey"}, id="get_books_from_ids"),
+        pytest.param(
+            book.get_books_by_order, (100,), {"ix_book_order_order_id", "book_catalog_pkey"}, id="get_books_by_order"
+        ),
+        pytest.param(book.get_unavailable_books, (), {"ix_book_catalog_on_loan"}, id="get_unavailable_books"),
+        pytest.param(
+            book.get_unavailable_books_from_ids,
+            ([1, 2, 3],),
+            {"book_catalog_pkey"},
+            id="get_unavailable_books_from_ids",
+        ),
+        pytest.param(book.get_user_book_list, (100,), {"ix_book_catalog_borrower_id"}, id="get_user_book_list"),
+        pytest.param(
+            book.get_books_taken_by_user,
+            (100,),
+            {"ix_order_user_id", "book_catalog_pkey"},
+            id="get_books_taken_by_user",
+        ),
+        pytest.param(book.update_book_status, (100,), {"ix_book_order_open", "book_pkey"}, id="update_book_status"),
+        pytest.param(
+            book.lend_order_books,
+            (100,),
+            {"order__pkey", "ix_book_order_order_id", "book_pkey"},
+            id="lend_order_books",
+        ),
+        pytest.param(book.delete_book, (100,), {"book_pkey", "book_catalog_pkey"}, id="delete_book"),
+        pytest.param(book.get_book_import_job, (100,), {"book_import_job_pkey"}, id="get_book_import_job"),
+        pytest.param(
+            book.set_book_import_job_status,
+            (100, BookImportStatus.DONE),
+            {"book_import_job_pkey"},
+            id="set_book_import_job_status",
+        ),
+        pytest.param(
+            book.checkpoint_book_import_job,
+            (100, 1024, 10, BookImportResult(inserted=8, duplicates=1, rejected=1)),
+            {"book_import_job_pkey"},
+            id="checkpoint_book_import_job",
+        ),
+        # user
+        pytest.param(user.get_user, (100,), {"user__pkey"}, id="get_user"),
+        pytest.param(user.delete_user, (100,), {"user__pkey"}, id="delete_user"),
+        # analytics
+        pytest.param(analytics.get_report_job, (100,), {"report_job_pkey"}, id="get_report_job"),
+        pytest.param(
+            analytics.set_report_job_status, (100, ReportStatus.DONE), {"report_job_pkey"}, id="set_report_job_status"
+        ),
+        pytest.param(analytics.get_report_version, (), REPORT_VERSION_INDEXES, id="get_report_version"),
+        pytest.param(analytics.begin_report_snapshot, (), REPORT_VERSION_INDEXES, id="begin_report_snapshot"),
+        # aio
+        pytest.param(aio_book.get_one_book, (123,), {"book_catalog_pkey"}, id="aio-get_one_book"),
+        pytest.param(aio_book.get_all_books_json, (PAGE,), {"ix_book_catalog_title"}, id="aio-get_all_books_json"),
+        pytest.param(
+            aio_book.filter_books_json,
+            ({"authors": [7, 8]}, PAGE),
+            {"ix_book_catalog_author_ids"},
+            id="aio-filter_books_json",
+        ),
+        pytest.param(
+            aio_book.get_books_from_ids_json, ([1, 2, 3],), {"book_catalog_pkey"}, id="aio-get_books_from_ids_json"
+        ),
+        pytest.param(
+            aio_book.get_user_book_list_json,
+            (100,),
+            {"ix_book_catalog_borrower_id"},
+            id="aio-get_user_book_list_json",
+        ),
+        pytest.param(
+            aio_user.get_user_by_email, ("reader5@example.com",), {"user__email_key"}, id="aio-get_user_by_email"
+        ),
+        pytest.param(aio_analytics.get_report_job, (100,), {"report_job_pkey"}, id="aio-get_report_job"),
+        pytest.param(
+            aio_analytics.start_report_job,
+            (timedelta(minutes=10),),
+            {"report_job_single_flight_idx"},
+            id="aio-start_report_job",
+        ),
+    ],
+)
+def test_query_uses_index(cursor, func, args, indexes):
+    plan = explain(cursor, func, *args)
+
+    assert indexes <= get_index_names(plan), plan
+
+
+@pytest.mark.parametrize("func", [book.count_all_books, aio_book.count_all_books])
+def test_count_all_books_uses_partial_index(cursor, func):
+    plan = explain(cursor, func)
+
+    assert LISTING_INDEXES & get_index_names(plan), plan
+
+
+def _explain_sql(cursor: psycopg2.extensions.cursor, sql: str, params: tuple) -> dict:
+    with pytest.raises(Explained) as explained:
+        cursor.execute(sql, params)
+
+    return explained.value.plan
+
+
+@pytest.mark.parametrize("table_name", CHANGE_TRACKED_TABLES)
+def test_delta_export_uses_updated_at_index(cursor, table_name):
+    since = datetime.now(tz=timezone.utc) + timedelta(days=1)
+    plan = _explain_sql(cursor, CHANGED_ROWS_SQL.format(table_name=table_name), (since, since + timedelta(hours=1)))
+
+    assert f"ix_{table_name}_updated_at" in get_index_names(plan), plan
+
+
+def test_delta_export_tombstones_use_deleted_at_index(cursor):
+    since = datetime.now(tz=timezone.utc) + timedelta(days=1)
+    plan = _explain_sql(cursor, TOMBSTONES_SQL, (since, since + timedelta(hours=1)))
+
+    assert "ix_row_tombstone_deleted_at" in get_index_names(plan), plan